@@ -1,6 +1,9 @@
 import sys
 import random
-from Tkinter import Tk, Canvas, mainloop
+try:
+    from Tkinter import Tk, Canvas, mainloop
+except ImportError:
+    Tk = None # no display: only headless simulations can be run
 
 WINDOW = 600
 BACKGROUND = "white"
@@ -92,6 +95,57 @@ class Colorizer(object):
 
 #-------------------------------------------------------------------------------
 
+class Simulation(object):
+    """
+    Grows an aggregate without drawing anything.  After run(),
+    'aggregate' holds the cells in the order they were filled (the
+    center cell first), and 'specks' holds (start, end, steps) for each
+    speck released, where end is None if the speck wandered off the grid.
+    """
+
+    def __init__(self, grid_size):
+        self.grid = Grid(grid_size)
+        self.aggregate = []
+        self.specks = []
+
+    def mark(self, speck):
+        self.grid[speck.x, speck.y] = True
+        self.aggregate.append((speck.x, speck.y))
+
+    def run(self):
+        # Fill in center cell.
+        self.mark(Speck(self.grid, (self.grid.size/2, self.grid.size/2)))
+
+        # Fill until the edge.
+        while True:
+            speck = Speck(self.grid)
+            start = (speck.x, speck.y)
+            while speck.on_grid() and not speck.stuck():
+                speck.move()
+            if speck.on_grid():
+                self.specks.append((start, (speck.x, speck.y), speck.steps))
+                self.mark(speck)
+                if speck.on_edge():
+                    break
+            else:
+                self.specks.append((start, None, speck.steps))
+        return self
+
+    def trace(self):
+        """
+        Return the "number,+steps" (stuck) or "number,-steps" (lost)
+        lines that dla-analyze.py reads.
+        """
+        lines = []
+        for (number, (start, end, steps)) in enumerate(self.specks):
+            if end is None:
+                lines.append("%d,-%d" % (number, steps))
+            else:
+                lines.append("%d,+%d" % (number, steps))
+        return lines
+
+#-------------------------------------------------------------------------------
+
 class Application(object):
 
     def __init__(self, root, grid_size):
@@ -117,25 +171,20 @@ class Application(object):
         self.fill(speck.x, speck.y, color)
 
     def evolve(self):
+        self.replay(Simulation(self.grid.size).run())
+
+    def replay(self, simulation):
         # Fill in center cell.
-        self.mark(Speck(self.grid, (self.grid.size/2, self.grid.size/2)),
-                  self.colorizer.next())
+        x, y = simulation.aggregate[0]
+        self.mark(Speck(self.grid, (x, y)), self.colorizer.next())
 
-        # Fill until the edge.
-        number = 0
-        while True:
-            speck = Speck(self.grid)
-            self.fill(speck.x, speck.y, "red")
-            while speck.on_grid() and not speck.stuck():
-                speck.move()
-            if speck.on_grid():
-                print "%d,+%d" % (number, speck.steps)
-                self.mark(speck, self.colorizer.next())
-                if speck.on_edge():
-                    break
-            else:
-                print "%d,-%d" % (number, speck.steps)
-            number += 1
+        # Show each speck's start, and where it stuck.
+        lines = simulation.trace()
+        for (i, (start, end, steps)) in enumerate(simulation.specks):
+            self.fill(start[0], start[1], "red")
+            print lines[i]
+            if end is not None:
+                self.mark(Speck(self.grid, end), self.colorizer.next())
 
 # mistakes: do not nest the final speck.on_edge test inside the speck.on_grid
 
@@ -148,6 +197,11 @@ def main(args):
 
     print "#", grid_size, seed
 
+    if (len(args) > 2 and args[2] == "headless") or Tk is None:
+        for line in Simulation(grid_size).run().trace():
+            print line
+        return None
+
     root = Tk()
     app = Application(root, grid_size)
     app.evolve()
@@ -158,4 +212,5 @@ def main(args):
 
 if __name__ == "__main__":
     root = main(sys.argv[1:])
-    root.mainloop()
+    if root is not None:
+        root.mainloop()
@@ -0,0 +1,217 @@
+import sys
+import numpy as np
+
+from dla import Grid, Simulation
+
+OFFSETS = np.array(Grid.Offsets)
+
+#-------------------------------------------------------------------------------
+
+class WalkerSimulation(Simulation):
+    """
+    Grows an aggregate like Simulation, but with many specks walking
+    at once, each step taken by all of them together with NumPy.
+
+    Specks that touch the aggregate in the same step are attached in
+    the order they were released, so a speck that finds its cell
+    already taken by an earlier one just keeps walking.  A speck that
+    has ended up inside the aggregate also keeps walking until it is
+    next to the aggregate on an empty cell.  The run stops when a speck
+    sticks on the edge; specks still walking then are not recorded.
+    Given the same seed, a run always gives the same result.
+    """
+
+    def __init__(self, grid_size, num_walkers=1000, seed=None):
+        Simulation.__init__(self, grid_size)
+        self.num_walkers = num_walkers
+        self.random = np.random.RandomState(seed)
+        # Filled cells, surrounded by a border of empty ones so that the
+        # neighbours of specks on the edge can be looked up.
+        self.occupied = np.zeros((grid_size+2, grid_size+2), bool)
+
+    def attach(self, x, y):
+        self.grid[x, y] = True
+        self.aggregate.append((x, y))
+        self.occupied[x+1, y+1] = True
+
+    def launch(self, num):
+        """
+        Vectorized Grid.random_edge_cell: a random cell along a random edge.
+        """
+        size = self.grid.size
+        r = self.random.randint(1, size-1, num)
+        side = self.random.randint(len(OFFSETS), size=num)
+        x = np.choose(side, (r, r, 0, size-1))
+        y = np.choose(side, (0, size-1, r, r))
+        return x, y
+
+    def move(self, x, y, moving):
+        """
+        Move the specks at indices 'moving' one step each.
+        """
+        delta = OFFSETS[self.random.randint(len(OFFSETS), size=len(moving))]
+        x[moving] += delta[:, 0]
+        y[moving] += delta[:, 1]
+
+    def lost(self, x, y):
+        """
+        Return which specks have wandered off the grid.
+        """
+        size = self.grid.size
+        return (x < 0) | (x >= size) | (y < 0) | (y >= size)
+
+    def run(self):
+        size = self.grid.size
+        occupied = self.occupied
+
+        # Fill in center cell.
+        self.attach(size/2, size/2)
+
+        # Release the first batch of specks.
+        num = self.num_walkers
+        x, y = self.launch(num)
+        start_x, start_y = x.copy(), y.copy()
+        steps = np.zeros(num, int)
+        number = np.arange(num)
+        released = num
+        results = {}
+
+        # Walk until a speck sticks on the edge.
+        done = False
+        while not done:
+            near = occupied[x+2, y+1] | occupied[x, y+1] | \
+                   occupied[x+1, y+2] | occupied[x+1, y]
+            touching = np.flatnonzero(near & ~occupied[x+1, y+1])
+            attached = np.zeros(num, bool)
+            for i in touching[np.argsort(number[touching], kind='mergesort')]:
+                if occupied[x[i]+1, y[i]+1]:
+                    continue
+                self.attach(x[i], y[i])
+                attached[i] = True
+                results[number[i]] = ((start_x[i], start_y[i]), (x[i], y[i]),
+                                      steps[i])
+                if x[i] in (0, size-1) or y[i] in (0, size-1):
+                    done = True
+                    break
+            if done:
+                break
+
+            # Everyone else takes a step; some fall off the grid.
+            moving = np.flatnonzero(~attached)
+            self.move(x, y, moving)
+            steps[moving] += 1
+            lost = self.lost(x, y)
+            for i in np.flatnonzero(lost):
+                results[number[i]] = ((start_x[i], start_y[i]), None, steps[i])
+
+            # Replace the specks that are finished with new ones.
+            finished = np.flatnonzero(attached | lost)
+            if len(finished):
+                x[finished], y[finished] = self.launch(len(finished))
+                start_x[finished], start_y[finished] = x[finished], y[finished]
+                steps[finished] = 0
+                number[finished] = np.arange(released, released + len(finished))
+                released += len(finished)
+
+        # Record the specks in the order they were released.
+        self.specks = [results[n] for n in sorted(results)]
+        return self
+
+#-------------------------------------------------------------------------------
+
+class LaunchSimulation(WalkerSimulation):
+    """
+    Like WalkerSimulation, but specks start on a circle just outside
+    the aggregate instead of at the edge of the grid, and a speck far
+    from the aggregate jumps to a random point on a circle around it
+    that doesn't reach the aggregate.  A random walk leaves a circle at
+    a uniformly random point, so the jumps change how fast specks
+    travel but not where they end up, and the aggregate grows with the
+    same statistics while taking far fewer steps.  A jump counts as one
+    step in the trace.  Specks that wander more than KILL times the
+    launch radius away, or off the grid, are lost.  Once the launch
+    circle no longer fits on the grid, specks start at the edge again.
+
+    Distances to the aggregate are kept in a map, updated near each
+    cell as it is filled; they are only tracked up to CAP, and beyond
+    that the distance from the center less the aggregate's radius is
+    used instead.
+
+    Specks start close to the aggregate, so many of them at once crowd
+    it and change its shape; a few (the default) keep the statistics of
+    one speck at a time.
+    """
+
+    MARGIN = 5
+    KILL = 2.0
+    CAP = 32
+
+    def __init__(self, grid_size, num_walkers=10, seed=None):
+        WalkerSimulation.__init__(self, grid_size, num_walkers, seed)
+        self.center = grid_size/2
+        self.radius = 0.0
+        self.distance = np.empty((grid_size, grid_size))
+        self.distance.fill(self.CAP)
+
+    def attach(self, x, y):
+        WalkerSimulation.attach(self, x, y)
+        self.radius = max(self.radius, np.hypot(x - self.center, y - self.center))
+        size, cap = self.grid.size, self.CAP
+        x0, x1 = max(0, x - cap), min(size, x + cap + 1)
+        y0, y1 = max(0, y - cap), min(size, y + cap + 1)
+        near = self.distance[x0:x1, y0:y1]
+        i, j = np.ogrid[x0:x1, y0:y1]
+        np.minimum(near, np.hypot(i - x, j - y), out=near)
+
+    def launch(self, num):
+        r = self.radius + self.MARGIN
+        if r > self.center - 1:
+            return WalkerSimulation.launch(self, num)
+        angle = self.random.uniform(0, 2 * np.pi, num)
+        x = np.rint(self.center + r * np.cos(angle)).astype(int)
+        y = np.rint(self.center + r * np.sin(angle)).astype(int)
+        return x, y
+
+    def move(self, x, y, moving):
+        # A jump of d-2 from a speck d from the aggregate lands more
+        # than one cell from it even after rounding, so can't skip
+        # past a cell where it would have stuck.
+        xm, ym = x[moving], y[moving]
+        d = np.maximum(self.distance[xm, ym],
+                       np.hypot(xm - self.center, ym - self.center) - self.radius)
+        far = d >= 4
+        WalkerSimulation.move(self, x, y, moving[~far])
+        jumping = moving[far]
+        r = d[far] - 2
+        angle = self.random.uniform(0, 2 * np.pi, len(jumping))
+        x[jumping] += np.rint(r * np.cos(angle)).astype(int)
+        y[jumping] += np.rint(r * np.sin(angle)).astype(int)
+
+    def lost(self, x, y):
+        kill = self.KILL * (self.radius + self.MARGIN)
+        return WalkerSimulation.lost(self, x, y) | \
+               (np.hypot(x - self.center, y - self.center) > kill)
+
+#-------------------------------------------------------------------------------
+
+def main(args):
+    grid_size = int(args[0])
+    seed = int(args[1])
+    kind = WalkerSimulation
+    num_walkers = 1000
+    if len(args) > 3 and args[3] == "launch":
+        kind = LaunchSimulation
+        num_walkers = 10
+    if len(args) > 2:
+        num_walkers = int(args[2])
+
+    print "#", grid_size, seed, num_walkers
+
+    simulation = kind(grid_size, num_walkers, seed).run()
+    for line in simulation.trace():
+        print line
+
+#-------------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
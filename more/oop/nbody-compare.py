@@ -0,0 +1,58 @@
+# Compare the speed of the pure-Python n-body programs.
+#
+# Each program is run as a separate process (they all do their work
+# at the top level), and the timing at the end of its one-line report
+# is collected.
+#
+# usage: nbody-compare.py num_timesteps [repeats]
+
+import sys
+import os
+import subprocess
+
+PROGRAMS = [
+    'nbody-original.py',
+    'nbody-final.py',
+    'nbody-reoptimized.py',
+    'nbody-slots.py'
+]
+
+#-------------------------------------------------------------------------------
+
+def run(program, timesteps):
+    '''Run one program, returning its energy change (%) and time (sec).'''
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    path = os.path.join(here, program)
+    output = subprocess.check_output([sys.executable, path, str(timesteps)])
+    # Report looks like "Name: e_final - e_original (d_energy %) / d_time".
+    line = output.strip().split('\n')[-1]
+    d_energy = float(line.split('(')[1].split()[0])
+    d_time = float(line.split('/')[-1])
+    return d_energy, d_time
+
+def main(args):
+    timesteps = int(args[1])
+    if len(args) > 2:
+        repeats = int(args[2])
+    else:
+        repeats = 3
+
+    results = []
+    for program in PROGRAMS:
+        times = []
+        for i in range(repeats):
+            d_energy, d_time = run(program, timesteps)
+            times.append(d_time)
+        results.append((program, d_energy, min(times)))
+
+    base = results[0][2]
+    print "%-22s %12s %10s %10s" % ("Program", "Time (s)", "Relative", "dE (%)")
+    for (program, d_energy, d_time) in results:
+        print "%-22s %12.6f %10.2f %10.6f" % \
+              (program, d_time, d_time / base, d_energy)
+
+#-------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    main(sys.argv)
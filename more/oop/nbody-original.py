@@ -118,16 +118,18 @@ def combinations(vals):
 
 #-------------------------------------------------------------------------------
 
-timesteps = int(sys.argv[1])
-system = list(BODIES.values())
-pairs = combinations(system)
-offset_momentum(BODIES['sun'], system)
-e_original = report_energy(system, pairs)
-t_original = time.time()
-advance(0.01, timesteps, system, pairs)
-t_final = time.time()
-e_final = report_energy(system, pairs)
-d_energy = 100 * abs((e_final - e_original) / e_original)
-d_time = t_final - t_original
-print "%-9s: %.9f - %.9f (%f %%) / %.9f" % \
-      ("Original", e_final, e_original, d_energy, d_time)
+if __name__ == '__main__':
+
+    timesteps = int(sys.argv[1])
+    system = list(BODIES.values())
+    pairs = combinations(system)
+    offset_momentum(BODIES['sun'], system)
+    e_original = report_energy(system, pairs)
+    t_original = time.time()
+    advance(0.01, timesteps, system, pairs)
+    t_final = time.time()
+    e_final = report_energy(system, pairs)
+    d_energy = 100 * abs((e_final - e_original) / e_original)
+    d_time = t_final - t_original
+    print "%-9s: %.9f - %.9f (%f %%) / %.9f" % \
+          ("Original", e_final, e_original, d_energy, d_time)
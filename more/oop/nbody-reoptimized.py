@@ -140,14 +140,16 @@ bodies = [
          5.15138902046611451e-05 * SOLAR_MASS)
 ]
 
-timesteps = int(sys.argv[1])
-offset_momentum(bodies[0], bodies)
-e_original = total_energy(bodies)
-t_original = time.time()
-advance(0.01, timesteps, bodies)
-t_final = time.time()
-e_final = total_energy(bodies)
-d_energy = 100 * abs((e_final - e_original) / e_original)
-d_time = t_final - t_original
-print "%-9s: %.9f - %.9f (%f %%) / %.9f" % \
-      ("Optimized", e_final, e_original, d_energy, d_time)
+if __name__ == '__main__':
+
+    timesteps = int(sys.argv[1])
+    offset_momentum(bodies[0], bodies)
+    e_original = total_energy(bodies)
+    t_original = time.time()
+    advance(0.01, timesteps, bodies)
+    t_final = time.time()
+    e_final = total_energy(bodies)
+    d_energy = 100 * abs((e_final - e_original) / e_original)
+    d_time = t_final - t_original
+    print "%-9s: %.9f - %.9f (%f %%) / %.9f" % \
+          ("Optimized", e_final, e_original, d_energy, d_time)
@@ -9,7 +9,9 @@
 import sys
 from math import pi
 import time
-from turtle import Turtle, setworldcoordinates, setup, screensize, mainloop
+import threading
+from turtle import Turtle, setworldcoordinates, setup, screensize, mainloop, \
+     tracer, update, ontimer
 
 SOLAR_MASS = 4 * pi * pi
 DAYS_PER_YEAR = 365.24
@@ -54,14 +56,16 @@ class Body(object):
         self.move()
         self.turtle.pendown()
 
-    def move(self):
-        x = self.pos.x * self.scaling
-        y = self.pos.y * self.scaling
+    def move(self, pos=None):
+        if pos is None:
+            pos = (self.pos.x, self.pos.y)
+        x = pos[0] * self.scaling
+        y = pos[1] * self.scaling
         self.turtle.goto((x, y))
 
 #-------------------------------------------------------------------------------
 
-def advance(dt, num_steps, bodies):
+def advance(dt, num_steps, bodies, draw=True):
 
     for step in range(num_steps):
 
@@ -78,7 +82,8 @@ def advance(dt, num_steps, bodies):
 
         for b in bodies:
             b.pos.muladd(b.vel, dt)
-            b.move()
+            if draw:
+                b.move()
 
 #-------------------------------------------------------------------------------
 
@@ -111,6 +116,68 @@ def offset_momentum(ref, bodies):
 
 #-------------------------------------------------------------------------------
 
+class Simulation(threading.Thread):
+    """
+    Run the physics in a background thread at full speed, publishing
+    the latest positions for the display to sample.  Turtles may only
+    be touched from the main thread, so this never draws anything.
+    """
+
+    BATCH = 10 # steps between snapshots
+
+    def __init__(self, dt, num_steps, bodies):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.dt = dt
+        self.num_steps = num_steps
+        self.bodies = bodies
+        self.lock = threading.Lock()
+        self.latest = self.snapshot()
+        self.elapsed = None
+        self.done = False
+
+    def snapshot(self):
+        return [(b.pos.x, b.pos.y) for b in self.bodies]
+
+    def run(self):
+        t_original = time.time()
+        remaining = self.num_steps
+        while remaining > 0:
+            batch = min(self.BATCH, remaining)
+            advance(self.dt, batch, self.bodies, draw=False)
+            remaining -= batch
+            latest = self.snapshot()
+            with self.lock:
+                self.latest = latest
+        self.elapsed = time.time() - t_original
+        self.done = True
+
+def animate(simulation, frame_rate, finished):
+    """
+    Draw the most recent snapshot frame_rate times per second, with
+    automatic screen updates turned off so that each frame is drawn
+    in a single update.  Call finished() once the simulation is over
+    and its final state has been drawn.
+    """
+    interval = int(1000 / frame_rate)
+    tracer(0)
+
+    def frame():
+        done = simulation.done
+        with simulation.lock:
+            latest = simulation.latest
+        for (b, pos) in zip(simulation.bodies, latest):
+            b.move(pos)
+        update()
+        if done:
+            finished()
+        else:
+            ontimer(frame, interval)
+
+    frame()
+
+#-------------------------------------------------------------------------------
+
 half_screen_size = 150
 setup(3 * half_screen_size, 3 * half_screen_size)
 screensize(2 * half_screen_size, 2 * half_screen_size)
@@ -169,15 +236,26 @@ bodies = [
          scaling)
 ]
 
+def report(e_original, d_time):
+    e_final = total_energy(bodies)
+    d_energy = 100 * abs((e_final - e_original) / e_original)
+    print "%-9s: %.9f - %.9f (%f %%) / %.9f" % \
+          ("Optimized", e_final, e_original, d_energy, d_time)
+
+# With a frame rate as the second argument, the physics runs in the
+# background and the display only samples it; otherwise every body is
+# redrawn on every step.
 timesteps = int(sys.argv[1])
 offset_momentum(bodies[0], bodies)
 e_original = total_energy(bodies)
-t_original = time.time()
-advance(0.01, timesteps, bodies)
-t_final = time.time()
-e_final = total_energy(bodies)
-d_energy = 100 * abs((e_final - e_original) / e_original)
-d_time = t_final - t_original
-print "%-9s: %.9f - %.9f (%f %%) / %.9f" % \
-      ("Optimized", e_final, e_original, d_energy, d_time)
+if len(sys.argv) > 2:
+    frame_rate = float(sys.argv[2])
+    simulation = Simulation(0.01, timesteps, bodies)
+    simulation.start()
+    animate(simulation, frame_rate,
+            lambda: report(e_original, simulation.elapsed))
+else:
+    t_original = time.time()
+    advance(0.01, timesteps, bodies)
+    report(e_original, time.time() - t_original)
 mainloop()
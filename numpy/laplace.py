@@ -5,7 +5,11 @@ Day 2
 
 Example taken from Scipy Cookbook"""
 
+import sys
+import time
 import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
 import matplotlib.pyplot as plt
 
 class Grid(object):
@@ -39,13 +43,183 @@ class Grid(object):
         return np.sqrt(np.dot(v,v))
 
 
+class Multigrid(object):
+    """Geometric multigrid V-cycles for the 5-point Laplacian on a
+    grid of a given shape and spacing.  Each level keeps every other
+    point of the one above in both directions, down to 3 points on the
+    shorter side, and the coarsest level is solved by over-relaxed
+    sweeps.  When a side has an odd number of intervals its last point
+    is kept as well, so that level's last interval is half the width of
+    the others; every level therefore stores its spacings as arrays and
+    uses the Laplacian for unevenly spaced points, which lets grids of
+    any size coarsen all the way down.  The arrays and transfer
+    operators for every level are built once, with the hierarchy."""
+
+    PRE_SWEEPS = 2
+    POST_SWEEPS = 2
+    COARSE_SWEEPS = 200
+
+    def __init__(self, shape, dx, dy):
+        self.levels = []
+        nx, ny = shape
+        hx = np.empty(nx - 1)
+        hx.fill(dx)
+        hy = np.empty(ny - 1)
+        hy.fill(dy)
+        while True:
+            level = {'coeffs' : laplacian_coeffs(hx) + laplacian_coeffs(hy),
+                     'hx' : hx, 'hy' : hy,
+                     'u' : np.zeros((len(hx) + 1, len(hy) + 1), 'd'),
+                     'f' : np.zeros((len(hx) + 1, len(hy) + 1), 'd'),
+                     'r' : np.zeros((len(hx) + 1, len(hy) + 1), 'd')}
+            self.levels.append(level)
+            if min(len(hx), len(hy)) <= 2:
+                break
+            level['px'], hx = interpolation(hx)
+            level['py'], hy = interpolation(hy)
+            level['rx'] = full_weighting(level['px'])
+            level['ry'] = full_weighting(level['py'])
+
+    def vcycle(self, u):
+        """Improves u in place (boundary values fixed) with one V-cycle
+        for Laplace's equation."""
+        top = self.levels[0]
+        top['f'][...] = 0.0
+        self.cycle(0, u)
+
+    def cycle(self, depth, u):
+        level = self.levels[depth]
+        f, r, coeffs = level['f'], level['r'], level['coeffs']
+        if depth == len(self.levels) - 1:
+            nx, ny = u.shape
+            dx2, dy2 = level['hx'].mean()**2, level['hy'].mean()**2
+            rho = (dy2*np.cos(np.pi/(nx-1)) + dx2*np.cos(np.pi/(ny-1)))/(dx2 + dy2)
+            omega = 2.0/(1.0 + np.sqrt(max(1.0 - rho*rho, 0.0)))
+            smooth(u, f, coeffs, self.COARSE_SWEEPS, omega)
+            return
+        smooth(u, f, coeffs, self.PRE_SWEEPS)
+        residual(u, f, coeffs, r)
+        coarse = self.levels[depth+1]
+        coarse['f'][...] = level['ry'].dot(level['rx'].dot(r).T).T
+        coarse['u'][...] = 0.0
+        self.cycle(depth+1, coarse['u'])
+        u += level['py'].dot(level['px'].dot(coarse['u']).T).T
+        smooth(u, f, coeffs, self.POST_SWEEPS)
+
+def laplacian_coeffs(h):
+    """Returns the weights of the lower and upper neighbours of each
+    interior point in the second difference along an axis whose
+    points are h apart (so (lower*u[i-1] - (lower + upper)*u[i] +
+    upper*u[i+1]) approximates u'' at point i)."""
+    left, right = h[:-1], h[1:]
+    return 2.0/(left*(left + right)), 2.0/(right*(left + right))
+
+def interpolation(h):
+    """Coarsens an axis whose points are h apart by keeping every other
+    point, and the last one.  Returns the sparse linear interpolation
+    from the coarse points to the fine ones, and the coarse spacings."""
+    n = len(h)
+    keep = range(0, n + 1, 2)
+    if n % 2:
+        keep.append(n)
+    x = np.concatenate(([0.0], np.cumsum(h)))
+    rows, cols, vals = [], [], []
+    for (c, i) in enumerate(keep):
+        rows.append(i)
+        cols.append(c)
+        vals.append(1.0)
+        if c + 1 < len(keep) and keep[c+1] == i + 2:
+            w = (x[i+1] - x[i])/(x[i+2] - x[i])
+            rows.extend([i + 1, i + 1])
+            cols.extend([c, c + 1])
+            vals.extend([1.0 - w, w])
+    p = sp.csr_matrix((vals, (rows, cols)), shape=(n + 1, len(keep)))
+    return p, np.diff(x[keep])
+
+def full_weighting(p):
+    """Restriction matching interpolation p: each coarse point takes
+    the average of the fine points p interpolates it to, weighted by
+    p.  The boundary rows are zeroed, as the coarse-grid correction
+    is zero there."""
+    sums = np.asarray(p.sum(axis=0)).ravel()
+    r = sp.diags(1.0/sums).dot(p.T).tolil()
+    r[0, :] = 0.0
+    r[-1, :] = 0.0
+    return r.tocsr()
+
+def smooth(u, f, coeffs, sweeps, omega=1.0):
+    """Red-black Gauss-Seidel (or, with omega > 1, SOR) sweeps for
+    Lap(u) = f, leaving the boundary of u alone.  coeffs holds the
+    neighbour weights along x and then y, from laplacian_coeffs."""
+    nx, ny = u.shape
+    west, east, south, north = coeffs
+    for sweep in range(sweeps):
+        for (i0, j0) in ((1, 1), (2, 2), (1, 2), (2, 1)):
+            w = west[i0-1::2, np.newaxis]
+            e = east[i0-1::2, np.newaxis]
+            s = south[j0-1::2]
+            n = north[j0-1::2]
+            centre = u[i0:nx-1:2, j0:ny-1:2]
+            target = (w*u[i0-1:nx-2:2, j0:ny-1:2] + e*u[i0+1:nx:2, j0:ny-1:2] +
+                      s*u[i0:nx-1:2, j0-1:ny-2:2] + n*u[i0:nx-1:2, j0+1:ny:2] -
+                      f[i0:nx-1:2, j0:ny-1:2])/(w + e + s + n)
+            centre += omega*(target - centre)
+
+def residual(u, f, coeffs, r):
+    """Stores f - Lap(u) in the interior of r (its boundary stays 0)."""
+    west, east, south, north = coeffs
+    w, e = west[:, np.newaxis], east[:, np.newaxis]
+    c = u[1:-1, 1:-1]
+    r[1:-1, 1:-1] = f[1:-1, 1:-1] - \
+        (w*u[:-2, 1:-1] - (w + e)*c + e*u[2:, 1:-1] +
+         south*u[1:-1, :-2] - (south + north)*c + north*u[1:-1, 2:])
+
+
+# Sparse operators and their factorizations, keyed by grid shape and
+# spacing, so that they are only built once no matter how many times
+# the boundary conditions change.
+_operators = {}
+
+def sparse_operator(shape, dx, dy):
+    """Returns a dictionary holding the negative 5-point Laplacian over
+    the interior points of a grid (a symmetric positive definite sparse
+    matrix, 'matrix'), plus its LU factorization ('lu') and an
+    incomplete LU preconditioner for conjugate gradients ('ilu'), the
+    latter two computed the first time they are asked for."""
+    key = (shape, dx, dy)
+    if key not in _operators:
+        m, n = shape[0] - 2, shape[1] - 2
+        second = lambda k: sp.diags([-np.ones(k-1), 2*np.ones(k), -np.ones(k-1)],
+                                    [-1, 0, 1])
+        matrix = sp.kron(second(m), sp.identity(n))/dx**2 + \
+                 sp.kron(sp.identity(m), second(n))/dy**2
+        _operators[key] = {'matrix' : matrix.tocsc()}
+    return _operators[key]
+
+def boundary_rhs(u, dx, dy):
+    """Returns the right-hand side that the boundary values of u
+    contribute to the interior equations, flattened to match
+    sparse_operator."""
+    b = np.zeros((u.shape[0] - 2, u.shape[1] - 2), 'd')
+    b[0, :] += u[0, 1:-1]/dx**2
+    b[-1, :] += u[-1, 1:-1]/dx**2
+    b[:, 0] += u[1:-1, 0]/dy**2
+    b[:, -1] += u[1:-1, -1]/dy**2
+    return b.ravel()
+
+
 class LaplaceSolver(object):
     """A simple Laplacian solver that can use different schemes to
     solve the problem."""
-    def __init__(self, grid):
+    def __init__(self, grid, stepper='slow'):
         self.grid = grid
+        self.work = None
+        self.multigrid = None
+        self.history = []
+        self.converged = False
+        self.setTimeStepper(stepper)
 
-    def timeStep(self, dt=0.0):
+    def slowTimeStep(self, dt=0.0):
         """Takes a time step using straight forward Python loops."""
         g = self.grid
         nx, ny = g.u.shape
@@ -64,24 +238,225 @@ class LaplaceSolver(object):
 
         return np.sqrt(err)
 
-    def solve(self, n_iter=0, eps=1.0e-16):
-        err = self.timeStep()
-        count = 1
+    def jacobiTimeStep(self, dt=0.0):
+        """Takes a Jacobi time step using NumPy slices.  The previous
+        solution is copied into g.old_u, which every new value is
+        computed from, so no arrays are allocated."""
+        g = self.grid
+        np.copyto(g.old_u, g.u)
+        self.relax(g.u, g.old_u, 1, 1, 1)
+        return self.interiorError()
+
+    def redBlackTimeStep(self, dt=0.0):
+        """Takes a Gauss-Seidel time step in red-black order: first
+        every interior point with i+j even is updated in place from its
+        (odd) neighbours using strided slices, then every point with
+        i+j odd from the freshly updated even ones."""
+        g = self.grid
+        np.copyto(g.old_u, g.u)
+        for (i0, j0) in ((1, 1), (2, 2), (1, 2), (2, 1)):
+            self.relax(g.u, g.u, i0, j0, 2)
+        return self.interiorError()
 
-        while err > eps:
-            if n_iter and count >= n_iter:
-                return err
+    def sorTimeStep(self, dt=0.0):
+        """Takes a successive over-relaxation time step: a red-black
+        Gauss-Seidel sweep in which each point moves omega times as
+        far as Gauss-Seidel would move it, using the optimal omega
+        for the grid."""
+        g = self.grid
+        omega = self.optimalOmega()
+        np.copyto(g.old_u, g.u)
+        for (i0, j0) in ((1, 1), (2, 2), (1, 2), (2, 1)):
+            self.relax(g.u, g.u, i0, j0, 2, omega)
+        return self.interiorError()
+
+    def multigridTimeStep(self, dt=0.0):
+        """Takes one multigrid V-cycle.  The number of cycles needed
+        does not grow with the size of the grid (for roughly square
+        cells)."""
+        g = self.grid
+        if self.multigrid is None or \
+           self.multigrid.levels[0]['u'].shape != g.u.shape:
+            self.multigrid = Multigrid(g.u.shape, g.dx, g.dy)
+        np.copyto(g.old_u, g.u)
+        self.multigrid.vcycle(g.u)
+        return self.interiorError()
+
+    def luTimeStep(self, dt=0.0):
+        """Solves for the interior directly with a sparse LU
+        factorization of the Laplacian.  The factorization is cached
+        for the grid's shape, so solving again after only the boundary
+        conditions have changed costs just a pair of triangular
+        solves."""
+        g = self.grid
+        op = sparse_operator(g.u.shape, g.dx, g.dy)
+        if 'lu' not in op:
+            op['lu'] = spla.splu(op['matrix'])
+        np.copyto(g.old_u, g.u)
+        x = op['lu'].solve(boundary_rhs(g.u, g.dx, g.dy))
+        g.u[1:-1, 1:-1] = x.reshape(g.u.shape[0] - 2, g.u.shape[1] - 2)
+        return self.interiorError()
+
+    def cgTimeStep(self, dt=0.0):
+        """Solves for the interior with conjugate gradients, starting
+        from the current solution and preconditioned with an incomplete
+        LU factorization that is cached along with the matrix."""
+        g = self.grid
+        op = sparse_operator(g.u.shape, g.dx, g.dy)
+        if 'ilu' not in op:
+            # No reordering or pivoting, so the factors stay close to an
+            # incomplete Cholesky factorization (which CG needs to be
+            # symmetric).
+            ilu = spla.spilu(op['matrix'], drop_tol=1.0e-3, fill_factor=10,
+                             permc_spec='NATURAL', diag_pivot_thresh=0.0)
+            op['ilu'] = spla.LinearOperator(op['matrix'].shape, ilu.solve)
+        np.copyto(g.old_u, g.u)
+        shape = (g.u.shape[0] - 2, g.u.shape[1] - 2)
+        x, info = spla.cg(op['matrix'], boundary_rhs(g.u, g.dx, g.dy),
+                          x0=g.u[1:-1, 1:-1].ravel(), tol=1.0e-10,
+                          M=op['ilu'])
+        g.u[1:-1, 1:-1] = x.reshape(shape)
+        return self.interiorError()
+
+    def optimalOmega(self):
+        """Returns the over-relaxation factor 2/(1 + sqrt(1 - rho**2))
+        that makes SOR converge fastest, where rho is the spectral
+        radius of the Jacobi iteration for the grid's shape and
+        spacing.  Convergence then takes O(N) sweeps rather than the
+        O(N**2) needed by Gauss-Seidel."""
+        g = self.grid
+        nx, ny = g.u.shape
+        dx2, dy2 = g.dx**2, g.dy**2
+        rho = (dy2*np.cos(np.pi/(nx-1)) + dx2*np.cos(np.pi/(ny-1)))/(dx2 + dy2)
+        return 2.0/(1.0 + np.sqrt(1.0 - rho*rho))
+
+    def relax(self, dst, src, i0, j0, step, omega=1.0):
+        """Moves dst[i0::step, j0::step] (interior points only) omega
+        of the way from their current values to the weighted average
+        of their neighbours in src, using the solver's work buffer
+        instead of temporary arrays."""
+        g = self.grid
+        nx, ny = dst.shape
+        dx2, dy2 = g.dx**2, g.dy**2
+        dnr_inv = 0.5/(dx2 + dy2)
+        centre = dst[i0:nx-1:step, j0:ny-1:step]
+        work = self.workspace()[:centre.shape[0], :centre.shape[1]]
+        if omega == 1.0:
+            centre[...] = 0.0
+        else:
+            centre *= 1.0 - omega
+        np.add(src[i0-1:nx-2:step, j0:ny-1:step],
+               src[i0+1:nx:step, j0:ny-1:step], out=work)
+        work *= omega*dy2*dnr_inv
+        centre += work
+        np.add(src[i0:nx-1:step, j0-1:ny-2:step],
+               src[i0:nx-1:step, j0+1:ny:step], out=work)
+        work *= omega*dx2*dnr_inv
+        centre += work
+
+    def workspace(self):
+        """Returns a buffer the size of the grid's interior, allocating
+        it only when the grid's shape changes."""
+        shape = (self.grid.u.shape[0] - 2, self.grid.u.shape[1] - 2)
+        if self.work is None or self.work.shape != shape:
+            self.work = np.empty(shape, 'd')
+        return self.work
+
+    def interiorError(self):
+        """Computes the L2 norm of the change in the solution, like
+        Grid.computeError but without allocating (boundary values
+        never change)."""
+        g = self.grid
+        work = self.workspace()
+        np.subtract(g.u[1:-1, 1:-1], g.old_u[1:-1, 1:-1], out=work)
+        v = work.ravel()
+        return np.sqrt(np.dot(v, v))
+
+    def setTimeStepper(self, stepper='slow'):
+        """Sets the time step scheme to be used while solving given a
+        string which should be one of ['slow', 'jacobi', 'redblack',
+        'sor', 'multigrid', 'lu', 'cg'].  'lu' and 'cg' solve the whole
+        problem in one step, so solve() returns after the next step
+        confirms that nothing changed."""
+        steppers = {'slow' : self.slowTimeStep,
+                    'jacobi' : self.jacobiTimeStep,
+                    'redblack' : self.redBlackTimeStep,
+                    'sor' : self.sorTimeStep,
+                    'multigrid' : self.multigridTimeStep,
+                    'lu' : self.luTimeStep,
+                    'cg' : self.cgTimeStep}
+        assert stepper in steppers, 'Unknown stepper "%s"' % stepper
+        self.timeStep = steppers[stepper]
+
+    def solve(self, n_iter=0, eps=1.0e-16, patience=10):
+        """Iterates until the change in the solution is at most eps, or
+        is down to the round-off in u (see roundoff), and returns the
+        number of iterations taken.  Also stops after n_iter iterations
+        (if given), or if the change hasn't reached a new low in
+        'patience' iterations; self.converged says whether the change
+        got small enough."""
+        count = 0
+        self.history = []
+        self.converged = False
+        best, best_count = None, 0
+
+        while True:
             err = self.timeStep()
             count = count + 1
+            self.history.append(err)
+            if err <= eps or err <= roundoff(self.grid.u):
+                self.converged = True
+                break
+            if best is None or err < best:
+                best, best_count = err, count
+            if (n_iter and count >= n_iter) or count - best_count >= patience:
+                break
 
         return count
 
+    def residual(self):
+        """Computes the L2 norm of the discrete Laplacian of the
+        current solution over the interior (zero when solved)."""
+        g = self.grid
+        u = g.u
+        lap = (u[:-2, 1:-1] - 2*u[1:-1, 1:-1] + u[2:, 1:-1])/g.dx**2 + \
+              (u[1:-1, :-2] - 2*u[1:-1, 1:-1] + u[1:-1, 2:])/g.dy**2
+        v = lap.flat
+        return np.sqrt(np.dot(v, v))
+
+    def convergenceReport(self):
+        """Summarizes the last call to solve: the number of iterations,
+        whether it converged, the final change in the solution, the
+        final residual, and the change after each iteration."""
+        return {'iterations' : len(self.history),
+                'converged' : self.converged,
+                'error' : self.history[-1] if self.history else None,
+                'residual' : self.residual(),
+                'history' : list(self.history)}
+
+def roundoff(u):
+    """The smallest change in u (as an L2 norm) that iterating can be
+    expected to reach: a few units in the last place of every value."""
+    return 16*np.finfo(u.dtype).eps*np.sqrt(np.vdot(u, u))
+
 def boundary_conditions(x, y, a=1.):
     return 10
 
 if __name__ == '__main__':
-    grid = Grid()
+    stepper = 'slow'
+    n = 10
+    if len(sys.argv) > 1:
+        stepper = sys.argv[1]
+    if len(sys.argv) > 2:
+        n = int(sys.argv[2])
+
+    grid = Grid(n, n)
     grid.setBCFunc(boundary_conditions)
 
-    solver = LaplaceSolver(grid)
+    solver = LaplaceSolver(grid, stepper)
+    start = time.time()
     solver.solve()
+    report = solver.convergenceReport()
+    print '%s: %d iterations in %.3f sec, residual %g%s' % \
+          (stepper, report['iterations'], time.time() - start, report['residual'],
+           '' if report['converged'] else ' (did not converge)')
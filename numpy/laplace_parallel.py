@@ -0,0 +1,150 @@
+"""Domain-decomposed parallel Laplace solver.
+
+The grid's values live in shared memory and the interior rows are
+split into strips, one per worker process.  Each iteration is a
+red-black over-relaxed sweep: every worker updates the red points of
+its own strip, then (once all have finished) the black points.  A
+strip's first and last rows need the neighbouring strips' edge rows
+(its halos); since red points only read black ones and vice versa,
+waiting for every worker between the two half-sweeps is all the
+exchange that is needed.  Each worker reports the squared change in
+its strip, and the parent adds these up for the global convergence
+check.
+
+usage: laplace_parallel.py [grid_size [max_workers [n_iter]]]
+"""
+
+import sys
+import time
+import multiprocessing as mp
+import numpy as np
+
+from laplace import Grid, LaplaceSolver, roundoff
+
+# Views of the shared grid inside each worker process.
+_u = None
+_dx2 = None
+_dy2 = None
+
+def harmonic_conditions(x, y):
+    """Boundary values from a function that solves Laplace's equation,
+    so the solution varies across the grid (a constant boundary gives
+    the same constant everywhere, whatever order points are swept in)."""
+    return np.sin(3*x)*np.cosh(3*y) + x**2 - y**2
+
+def init_worker(raw_u, shape, dx2, dy2):
+    global _u, _dx2, _dy2
+    _u = np.frombuffer(raw_u, dtype=np.float64).reshape(shape)
+    _dx2, _dy2 = dx2, dy2
+
+def sweep_strip(args):
+    """Over-relax the points of one colour (0 for i+j even, 1 for odd)
+    in rows lo..hi-1, returning the sum of the squared changes."""
+    lo, hi, colour, omega = args
+    u = _u
+    nx, ny = u.shape
+    dx2, dy2 = _dx2, _dy2
+    dnr_inv = 0.5/(dx2 + dy2)
+    total = 0.0
+    for i0 in (lo, lo + 1):
+        if i0 >= hi:
+            continue
+        j0 = 1 if (i0 + 1) % 2 == colour else 2
+        centre = u[i0:hi:2, j0:ny-1:2]
+        target = ((u[i0-1:hi-1:2, j0:ny-1:2] + u[i0+1:hi+1:2, j0:ny-1:2])*dy2 +
+                  (u[i0:hi:2, j0-1:ny-2:2] + u[i0:hi:2, j0+1:ny:2])*dx2)*dnr_inv
+        change = omega*(target - centre)
+        centre += change
+        v = change.ravel()
+        total += np.dot(v, v)
+    return total
+
+class ParallelLaplaceSolver(object):
+    """Solves Laplace's equation on a Grid with a pool of worker
+    processes, each owning a strip of rows.  The grid's u is copied
+    into shared memory for the solve and copied back afterwards."""
+
+    def __init__(self, grid, num_workers):
+        self.grid = grid
+        self.num_workers = num_workers
+        self.history = []
+        self.converged = False
+
+    def solve(self, n_iter=0, eps=1.0e-16, patience=10):
+        """Iterates like LaplaceSolver.solve with the 'sor' stepper,
+        returning the number of iterations taken and setting
+        self.converged."""
+        g = self.grid
+        nx, ny = g.u.shape
+        raw_u = mp.RawArray('d', g.u.size)
+        u = np.frombuffer(raw_u, dtype=np.float64).reshape(g.u.shape)
+        u[...] = g.u
+        omega = LaplaceSolver(g).optimalOmega()
+        bounds = np.linspace(1, nx-1, self.num_workers + 1).astype(int)
+        strips = [(bounds[k], bounds[k+1]) for k in range(self.num_workers)
+                  if bounds[k] < bounds[k+1]]
+        work = [[(lo, hi, colour, omega) for (lo, hi) in strips]
+                for colour in (0, 1)]
+
+        pool = mp.Pool(len(strips), init_worker,
+                       (raw_u, g.u.shape, g.dx**2, g.dy**2))
+        try:
+            self.history = []
+            self.converged = False
+            best, best_count = None, 0
+            count = 0
+            while True:
+                total = sum(pool.map(sweep_strip, work[0])) + \
+                        sum(pool.map(sweep_strip, work[1]))
+                err = np.sqrt(total)
+                count += 1
+                self.history.append(err)
+                if err <= eps or err <= roundoff(u):
+                    self.converged = True
+                    break
+                if best is None or err < best:
+                    best, best_count = err, count
+                if (n_iter and count >= n_iter) or count - best_count >= patience:
+                    break
+        finally:
+            pool.close()
+            pool.join()
+
+        g.u[...] = u
+        return count
+
+def run(n, num_workers, n_iter):
+    """Solve on an n x n grid with a given number of workers,
+    returning the solution and the time taken."""
+    grid = Grid(n, n)
+    grid.setBCFunc(harmonic_conditions)
+    solver = ParallelLaplaceSolver(grid, num_workers)
+    start = time.time()
+    solver.solve(n_iter=n_iter)
+    return grid.u, time.time() - start
+
+if __name__ == '__main__':
+    n = 513
+    max_workers = mp.cpu_count()
+    n_iter = 200
+    if len(sys.argv) > 1:
+        n = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        max_workers = int(sys.argv[2])
+    if len(sys.argv) > 3:
+        n_iter = int(sys.argv[3])
+
+    # Strong scaling: the same problem with more and more workers.
+    grid = Grid(n, n)
+    grid.setBCFunc(harmonic_conditions)
+    serial = LaplaceSolver(grid, 'sor')
+    start = time.time()
+    serial.solve(n_iter=n_iter)
+    base = time.time() - start
+    print '%d x %d grid, %d iterations' % (n, n, n_iter)
+    print '%-8s %10s %8s %12s' % ('workers', 'time', 'speedup', 'max diff')
+    print '%-8s %10.3f %8.2f %12s' % ('serial', base, 1.0, '-')
+    for num_workers in range(1, max_workers + 1):
+        u, elapsed = run(n, num_workers, n_iter)
+        print '%-8d %10.3f %8.2f %12.3g' % \
+              (num_workers, elapsed, base / elapsed, abs(u - grid.u).max())
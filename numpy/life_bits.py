@@ -0,0 +1,126 @@
+import sys
+import time
+import numpy as np
+
+import life_convolve
+
+# Each row of the board is stored as 64-bit words: bit k of word w
+# holds the cell in column 64*w + k.  Cells off the board are dead.
+BITS = 64
+ONE = np.uint64(1)
+TOP = np.uint64(BITS - 1)
+WEIGHTS = ONE << np.arange(BITS, dtype=np.uint64)
+
+def pack(board):
+    '''Pack an array of 0/1 cells into rows of 64-bit words.'''
+    nx, ny = board.shape
+    num_words = (ny + BITS - 1) // BITS
+    padded = np.zeros((nx, num_words * BITS), np.uint64)
+    padded[:, :ny] = board != 0
+    return (padded.reshape(nx, num_words, BITS) * WEIGHTS).sum(axis=2,
+                                                                dtype=np.uint64)
+
+def unpack(packed, ny):
+    '''Turn packed rows back into an array of 0/1 cells ny wide.'''
+    nx, num_words = packed.shape
+    bits = (packed[:, :, np.newaxis] >> np.arange(BITS, dtype=np.uint64)) & ONE
+    return bits.reshape(nx, num_words * BITS)[:, :ny].astype(np.uint8)
+
+def edge_mask(ny):
+    '''Words that clear the bits past the last column of each row.'''
+    num_words = (ny + BITS - 1) // BITS
+    mask = np.empty(num_words, np.uint64)
+    mask[:] = ~np.uint64(0)
+    extra = num_words * BITS - ny
+    if extra:
+        mask[-1] = ~np.uint64(0) >> np.uint64(extra)
+    return mask
+
+def full_add(a, b, c):
+    '''Add three bit-planes, returning the sum and carry planes.'''
+    partial = a ^ b
+    return partial ^ c, (a & b) | (c & partial)
+
+def advance(current, next, ny):
+    '''Compute the next generation of a packed board ny cells wide
+    into next, using bitwise adders on 64 cells at a time.'''
+
+    # Neighbours to the west and east of every cell, carrying bits
+    # across word boundaries.
+    west = current << ONE
+    west[:, 1:] |= current[:, :-1] >> TOP
+    east = current >> ONE
+    east[:, :-1] |= current[:, 1:] << TOP
+
+    # The same three columns one row up and one row down.
+    def shift_rows(plane, offset):
+        result = np.zeros_like(plane)
+        if offset > 0:
+            result[1:] = plane[:-1]
+        else:
+            result[:-1] = plane[1:]
+        return result
+
+    n, nw, ne = shift_rows(current, 1), shift_rows(west, 1), shift_rows(east, 1)
+    s, sw, se = shift_rows(current, -1), shift_rows(west, -1), shift_rows(east, -1)
+
+    # Add the eight neighbour planes: the count is ones + 2 * (number
+    # of twos planes set).  A cell lives if the count is 3, or 2 and it
+    # is already alive, i.e. exactly one twos plane is set and either
+    # the ones bit is set or the cell is alive.
+    ones_a, twos_a = full_add(n, s, west)
+    ones_b, twos_b = full_add(east, nw, ne)
+    ones_c, twos_c = sw ^ se, sw & se
+    ones, twos_d = full_add(ones_a, ones_b, ones_c)
+    pair_ab, pair_cd = twos_a ^ twos_b, twos_c ^ twos_d
+    both = (twos_a & twos_b) | (twos_c & twos_d)
+    exactly_one = (pair_ab ^ pair_cd) & ~both
+    np.bitwise_and(exactly_one, ones | current, out=next)
+    next &= edge_mask(ny)
+
+def evolve(length, generations):
+    current = np.zeros((length, length), np.uint8)  # create the initial world
+    current[length/2, 1:(length-1)] = 1             # initialize the world
+    current = pack(current)
+    next = np.zeros_like(current)                   # hold the world's next state
+
+    # advance through each time step
+    life_convolve.show(unpack(current, length))
+    for i in range(generations):
+        advance(current, next, length)
+        current, next = next, current
+        life_convolve.show(unpack(current, length))
+
+def benchmark(length, generations):
+    '''Compare cells/sec and board memory against life_convolve.'''
+    board = life_convolve.random_board(length, 0.3, 0)
+    expected, t_convolve = life_convolve.reference(board, generations)
+
+    current = pack(board)
+    next = np.zeros_like(current)
+    start = time.time()
+    for i in range(generations):
+        advance(current, next, length)
+        current, next = next, current
+    t_bits = time.time() - start
+
+    cells = float(length * length * generations)
+    print 'convolve: %12.0f cells/sec, %10d bytes' % \
+          (cells / t_convolve, board.nbytes)
+    print 'bits:     %12.0f cells/sec, %10d bytes' % \
+          (cells / t_bits, current.nbytes)
+    print 'same result:', (unpack(current, length) == expected).all()
+
+def main(args):
+    length = int(args[1])
+    if len(args) > 2:
+        generations = int(args[2])
+    else:
+        generations = length - 1
+    if len(args) > 3 and args[3] == 'benchmark':
+        benchmark(length, generations)
+    else:
+        evolve(length, generations)
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -1,22 +1,29 @@
 import sys
+import time
 import numpy as np
 from scipy.signal import convolve
 
+import life_output
+from life_output import show
+
 FILTER = np.array([[1, 1, 1],
                    [1, 0, 1],
                    [1, 1, 1]], dtype=np.uint8)
 
-def evolve(length, generations):
+def evolve(length, generations, writer=None):
     current = np.zeros((length, length), np.uint8)  # create the initial world
     current[length/2, 1:(length-1)] = 1             # initialize the world
     next = np.zeros_like(current)                   # hold the world's next state
+    work = workspace(current.shape)                 # scratch space for advance
+    writer = writer or life_output.TextWriter()     # where generations go
 
     # advance through each time step
-    show(current)
-    for i in range(generations):
-        advance(current, next)
+    writer.write(current, 0)
+    for i in range(1, generations + 1):
+        advance_inplace(current, next, work)
         current, next = next, current
-        show(current)
+        writer.write(current, i)
+    writer.close()
 
 def advance(current, next):
     assert current.shape[0] == current.shape[1], \
@@ -26,20 +33,75 @@ def advance(current, next):
     next[(current == 1) & ((neighbors == 2) | (neighbors == 3))] = 1
     next[(current == 0) & (neighbors == 3)] = 1
 
-def show(board):
-    nx, ny = board.shape
-    dashes = '+' + ('-' * nx) + '+'
-    print dashes
-    for y in range(ny-1, -1, -1):
-        line = '|'
-        for x in range(0, nx):
-            if board[x, y]:
-                line += '*'
-            else:
-                line += ' '
-        line += '|'
-        print line
-    print dashes
+# (destination, source) slices adding each neighbour into the count.
+def neighbor_slices(shape):
+    nx, ny = shape
+    slices = []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            if dx or dy:
+                dst = (slice(max(0, -dx), nx - max(0, dx)),
+                       slice(max(0, -dy), ny - max(0, dy)))
+                src = (slice(max(0, dx), nx - max(0, -dx)),
+                       slice(max(0, dy), ny - max(0, -dy)))
+                slices.append((dst, src))
+    return slices
+
+def workspace(shape):
+    return (np.empty(shape, np.uint8),  # neighbour counts
+            np.empty(shape, bool),      # cells with 3 neighbours
+            np.empty(shape, bool),      # cells with 2 neighbours
+            neighbor_slices(shape))
+
+def advance_inplace(current, next, work):
+    '''Same as advance, but only writes into next and the buffers
+    made by workspace(current.shape), allocating no arrays.'''
+    neighbors, three, two, slices = work
+    neighbors.fill(0)
+    for (dst, src) in slices:
+        np.add(neighbors[dst], current[src], out=neighbors[dst])
+    np.equal(neighbors, 3, out=three)
+    np.equal(neighbors, 2, out=two)
+    np.logical_and(two, current, out=two)
+    np.logical_or(three, two, out=next)
+
+def random_board(length, density, seed):
+    '''A length x length soup with each cell alive with probability
+    density, the same every time for the same seed.'''
+    return (np.random.RandomState(seed).rand(length, length) <
+            density).astype(np.uint8)
+
+def reference(board, generations, inplace=False):
+    '''Step a copy of board with advance (or advance_inplace), which the
+    other engines are checked against.  Returns the final board and the
+    seconds taken.'''
+    current, next = board.copy(), np.zeros_like(board)
+    work = workspace(board.shape)
+    start = time.time()
+    for i in range(generations):
+        if inplace:
+            advance_inplace(current, next, work)
+        else:
+            advance(current, next)
+        current, next = next, current
+    return current, time.time() - start
+
+def benchmark(length, generations):
+    '''Time advance and advance_inplace on a random board, counting the
+    page faults each causes per generation: large temporaries are
+    fresh memory from the system each time they are allocated.'''
+    import resource # Unix only, so not needed just to use this module
+    board = random_board(length, 0.3, 0)
+    results = []
+    for name in ('advance', 'advance_inplace'):
+        faults = resource.getrusage(resource.RUSAGE_SELF).ru_minflt
+        current, elapsed = reference(board, generations,
+                                     name == 'advance_inplace')
+        faults = resource.getrusage(resource.RUSAGE_SELF).ru_minflt - faults
+        results.append(current)
+        print '%-16s %10.4f sec/gen %10.1f faults/gen' % \
+              (name, elapsed / generations, float(faults) / generations)
+    print 'same result:', (results[0] == results[1]).all()
 
 def main(args):
     length = int(args[1])
@@ -47,7 +109,17 @@ def main(args):
         generations = int(args[2])
     else:
         generations = length - 1
-    evolve(length, generations)
+    if len(args) > 3 and args[3] == 'benchmark':
+        benchmark(length, generations)
+        return
+    every = 1
+    if len(args) > 3:
+        every = int(args[3])
+    if len(args) > 4:
+        writer = life_output.PBMWriter(args[4], every)
+    else:
+        writer = life_output.TextWriter(sys.stdout, every)
+    evolve(length, generations, writer)
 
 if __name__ == '__main__':
     main(sys.argv)
@@ -0,0 +1,274 @@
+import sys
+import numpy as np
+
+import life_convolve
+
+# HashLife: the world is a quadtree whose identical subtrees are shared,
+# and the future of every node is remembered, so repeated structure in
+# space and time is only ever computed once.  A node of level k covers
+# 2**k x 2**k cells; its result is its centre 2**(k-1) x 2**(k-1) cells
+# some power of two generations later.  Unlike the other life_* engines
+# the world doesn't end at the board's edges: the board is the window
+# onto the plane that is loaded and shown.
+
+class Node(object):
+    __slots__ = ('nw', 'ne', 'sw', 'se', 'level', 'population')
+
+    def __init__(self, nw, ne, sw, se, level, population):
+        self.nw, self.ne, self.sw, self.se = nw, ne, sw, se
+        self.level = level
+        self.population = population
+
+DEAD = Node(None, None, None, None, 0, 0)
+ALIVE = Node(None, None, None, None, 0, 1)
+
+class HashLife(object):
+    '''Canonical node table and memoized results.  When the table grows
+    past max_nodes, everything not reachable from the roots in use is
+    dropped along with all remembered results.'''
+
+    def __init__(self, max_nodes=1 << 20):
+        self.max_nodes = max_nodes
+        self.table = {}
+        self.results = {}
+        self.empties = [DEAD]
+        self.collections = 0
+
+    def join(self, nw, ne, sw, se):
+        key = (nw, ne, sw, se)
+        node = self.table.get(key)
+        if node is None:
+            node = Node(nw, ne, sw, se, nw.level + 1,
+                        nw.population + ne.population +
+                        sw.population + se.population)
+            self.table[key] = node
+        return node
+
+    def empty(self, level):
+        while len(self.empties) <= level:
+            e = self.empties[-1]
+            self.empties.append(self.join(e, e, e, e))
+        return self.empties[level]
+
+    def expand(self, node):
+        '''Surround node with empty space, giving a node one level up.'''
+        e = self.empty(node.level - 1)
+        return self.join(self.join(e, e, e, node.nw),
+                         self.join(e, e, node.ne, e),
+                         self.join(e, node.sw, e, e),
+                         self.join(node.se, e, e, e))
+
+    def centre(self, node):
+        return self.join(node.nw.se, node.ne.sw, node.sw.ne, node.se.nw)
+
+    def base(self, node):
+        '''One generation of the centre 2x2 cells of a 4x4 node.'''
+        cells = [[0] * 4 for i in range(4)]
+        for (qx, qy, quad) in ((0, 0, node.nw), (0, 2, node.ne),
+                               (2, 0, node.sw), (2, 2, node.se)):
+            cells[qx][qy] = quad.nw.population
+            cells[qx][qy+1] = quad.ne.population
+            cells[qx+1][qy] = quad.sw.population
+            cells[qx+1][qy+1] = quad.se.population
+        result = []
+        for x in (1, 2):
+            for y in (1, 2):
+                neighbors = sum(cells[x+i][y+j]
+                                for i in (-1, 0, 1) for j in (-1, 0, 1)) - \
+                            cells[x][y]
+                alive = neighbors == 3 or (neighbors == 2 and cells[x][y])
+                result.append(ALIVE if alive else DEAD)
+        return self.join(*result)
+
+    def successor(self, node, j):
+        '''The centre of node 2**j generations on; j <= node.level - 2.'''
+        if node.population == 0:
+            return node.nw
+        key = (node, j)
+        result = self.results.get(key)
+        if result is not None:
+            return result
+
+        if node.level == 2:
+            result = self.base(node)
+        else:
+            a, b, c, d = node.nw, node.ne, node.sw, node.se
+            parts = [a,
+                     self.join(a.ne, b.nw, a.se, b.sw),
+                     b,
+                     self.join(a.sw, a.se, c.nw, c.ne),
+                     self.join(a.se, b.sw, c.ne, d.nw),
+                     self.join(b.sw, b.se, d.nw, d.ne),
+                     c,
+                     self.join(c.ne, d.nw, c.se, d.sw),
+                     d]
+            # At full speed each half of the jump is taken by a level
+            # below; otherwise the first half is skipped by just taking
+            # centres, and the whole jump happens one level down.
+            if j == node.level - 2:
+                r = [self.successor(p, j - 1) for p in parts]
+                step = j - 1
+            else:
+                r = [self.centre(p) for p in parts]
+                step = j
+            result = self.join(
+                self.successor(self.join(r[0], r[1], r[3], r[4]), step),
+                self.successor(self.join(r[1], r[2], r[4], r[5]), step),
+                self.successor(self.join(r[3], r[4], r[6], r[7]), step),
+                self.successor(self.join(r[4], r[5], r[7], r[8]), step))
+
+        self.results[key] = result
+        return result
+
+    def collect(self, roots):
+        '''Drop nodes not reachable from roots, and all results, if the
+        table is too big.'''
+        if len(self.table) <= self.max_nodes:
+            return
+        table = {}
+        pending = list(roots) + self.empties[1:]
+        while pending:
+            node = pending.pop()
+            if node.level == 0:
+                continue
+            key = (node.nw, node.ne, node.sw, node.se)
+            if key not in table:
+                table[key] = node
+                pending.extend(key)
+        self.table = table
+        self.results = {}
+        self.collections += 1
+
+    def build(self, board, x, y, level):
+        '''The node covering board[x:x+2**level, y:y+2**level].'''
+        if level == 0:
+            return ALIVE if board[x, y] else DEAD
+        size = 1 << level
+        if not board[x:x+size, y:y+size].any():
+            return self.empty(level)
+        half = size >> 1
+        return self.join(self.build(board, x, y, level-1),
+                         self.build(board, x, y+half, level-1),
+                         self.build(board, x+half, y, level-1),
+                         self.build(board, x+half, y+half, level-1))
+
+    def draw(self, node, window, x, y):
+        '''Set the live cells of node, whose corner is at (x, y)
+        relative to window, in window.'''
+        size = 1 << node.level
+        nx, ny = window.shape
+        if node.population == 0 or x >= nx or y >= ny or \
+           x + size <= 0 or y + size <= 0:
+            return
+        if node.level == 0:
+            window[x, y] = 1
+            return
+        half = size >> 1
+        self.draw(node.nw, window, x, y)
+        self.draw(node.ne, window, x, y + half)
+        self.draw(node.sw, window, x + half, y)
+        self.draw(node.se, window, x + half, y + half)
+
+engine = HashLife()
+
+class Universe(object):
+    '''An unbounded world, initially holding board with its corner at
+    the origin.'''
+
+    def __init__(self, board, hashlife=None):
+        self.hashlife = hashlife or engine
+        level = 3
+        while (1 << level) < max(board.shape):
+            level += 1
+        padded = np.zeros((1 << level, 1 << level), np.uint8)
+        padded[:board.shape[0], :board.shape[1]] = board
+        self.root = self.hashlife.build(padded, 0, 0, level)
+        self.x = self.y = 0             # position of the root's corner
+        self.generation = 0
+
+    def jump(self, j):
+        '''Advance 2**j generations.'''
+        hl = self.hashlife
+        root = self.root
+        # The result is the root's centre, and in 2**j generations the
+        # pattern grows by at most 2**j <= 2**(level-3) cells each way,
+        # so it must start within the centre's centre to stay inside.
+        while root.level < j + 3 or \
+              hl.centre(hl.centre(root)).population != root.population:
+            offset = 1 << (root.level - 1)
+            root = hl.expand(root)
+            self.x -= offset
+            self.y -= offset
+        offset = 1 << (root.level - 2)
+        self.root = hl.successor(root, j)
+        self.x += offset
+        self.y += offset
+        self.generation += 1 << j
+        hl.collect([self.root])
+
+    def step(self, generations):
+        '''Advance any number of generations, a power of two at a time.'''
+        j = 0
+        while generations:
+            if generations & 1:
+                self.jump(j)
+            generations >>= 1
+            j += 1
+
+    def window(self, nx, ny, x=0, y=0):
+        '''The nx x ny cells whose corner is at (x, y).'''
+        result = np.zeros((nx, ny), np.uint8)
+        self.hashlife.draw(self.root, result, self.x - x, self.y - y)
+        return result
+
+def evolve(length, generations, every=1):
+    current = np.zeros((length, length), np.uint8)  # create the initial world
+    current[length/2, 1:(length-1)] = 1             # initialize the world
+    universe = Universe(current)
+
+    # advance every'th time step
+    life_convolve.show(universe.window(length, length))
+    for i in range(generations // every):
+        universe.step(every)
+        life_convolve.show(universe.window(length, length))
+
+def advance(current, next):
+    universe = Universe(current)
+    universe.step(1)
+    next[:, :] = universe.window(*current.shape)
+
+def check(length, generations):
+    '''Compare a random soup stepped one generation at a time with
+    life_convolve on a board big enough that nothing reaches its edge.'''
+    board = life_convolve.random_board(length, 0.4, 0)
+    margin = generations + 1
+    size = length + 2 * margin
+    current = np.zeros((size, size), np.uint8)
+    current[margin:margin+length, margin:margin+length] = board
+    universe = Universe(board)
+    for i in range(1, generations + 1):
+        current = life_convolve.reference(current, 1)[0]
+        universe.step(1)
+        if not (universe.window(size, size, -margin, -margin) == current).all():
+            print 'generation %d differs' % i
+            return False
+    print 'same for %d generations' % generations
+    return True
+
+def main(args):
+    length = int(args[1])
+    if len(args) > 2:
+        generations = int(args[2])
+    else:
+        generations = length - 1
+    if len(args) > 3 and args[3] == 'check':
+        check(length, generations)
+        return
+    if len(args) > 3:
+        every = int(args[3])
+    else:
+        every = 1
+    evolve(length, generations, every)
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -1,6 +1,8 @@
 import sys
 import numpy as np
 
+from life_output import show
+
 def evolve(length, generations):
     current = np.zeros((length, length), np.uint8)  # create the initial world
     current[length/2, 1:(length-1)] = 1             # initialize the world
@@ -28,21 +30,6 @@ def advance(current, next):
                 if neighbors == 3:
                     next[i, j] = 1
 
-def show(board):
-    nx, ny = board.shape
-    dashes = '+' + ('-' * nx) + '+'
-    print dashes
-    for y in range(ny-1, -1, -1):
-        line = '|'
-        for x in range(0, nx):
-            if board[x, y]:
-                line += '*'
-            else:
-                line += ' '
-        line += '|'
-        print line
-    print dashes
-
 def main(args):
     length = int(args[1])
     if len(args) > 2:
@@ -0,0 +1,71 @@
+import sys
+import numpy as np
+
+# Boards are drawn the way show() in life_looping.py always has: x
+# across the page, y up the page, inside a frame.  Whole rows of
+# characters are built at once from a lookup table instead of adding
+# one character at a time.
+
+CELLS = np.array([ord(' '), ord('*')], np.uint8)
+
+def render(board):
+    '''The framed picture of board as a string.'''
+    nx, ny = board.shape
+    dashes = '+' + ('-' * nx) + '+\n'
+    rows = np.empty((ny, nx + 3), np.uint8)
+    rows[:, 0] = rows[:, nx+1] = ord('|')
+    rows[:, nx+2] = ord('\n')
+    rows[:, 1:nx+1] = CELLS[(board.T[::-1] != 0).view(np.uint8)]
+    return dashes + rows.tostring() + dashes
+
+def show(board, stream=None):
+    (stream or sys.stdout).write(render(board))
+
+def image(board):
+    '''The board as rows of bits, top row first, ready for a PBM file.'''
+    return np.packbits(board.T[::-1] != 0, axis=1)
+
+class TextWriter(object):
+    '''Writes every'th generation to a stream as text.'''
+
+    def __init__(self, stream=None, every=1):
+        self.stream = stream or sys.stdout
+        self.every = every
+
+    def write(self, board, generation):
+        if generation % self.every == 0:
+            show(board, self.stream)
+
+    def close(self):
+        self.stream.flush()
+
+class PBMWriter(object):
+    '''Writes every'th generation to a file of binary PBM images, one
+    after another, one bit per cell; live cells are black.'''
+
+    def __init__(self, filename, every=1):
+        self.stream = open(filename, 'wb')
+        self.every = every
+
+    def write(self, board, generation):
+        if generation % self.every == 0:
+            nx, ny = board.shape
+            self.stream.write('P4\n%d %d\n' % (nx, ny))
+            self.stream.write(image(board).tostring())
+
+    def close(self):
+        self.stream.close()
+
+def read_pbm(filename):
+    '''Yield the boards in a file written by PBMWriter, one at a time.'''
+    with open(filename, 'rb') as reader:
+        while True:
+            magic = reader.readline()
+            if not magic:
+                break
+            assert magic.strip() == 'P4', 'Expected binary PBM image'
+            nx, ny = [int(n) for n in reader.readline().split()]
+            width = (nx + 7) // 8
+            bits = np.fromstring(reader.read(width * ny), np.uint8)
+            rows = np.unpackbits(bits.reshape(ny, width), axis=1)[:, :nx]
+            yield rows[::-1].T.copy()
@@ -0,0 +1,123 @@
+import sys
+import time
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+import life_convolve
+
+# The board is cut into square tiles.  A tile can only change if it or
+# one of its eight neighbouring tiles changed in the last generation,
+# so only those tiles are recomputed; on a mostly dead or settled board
+# that is a small fraction of them.
+
+class TiledLife(object):
+
+    def __init__(self, board, tile=16):
+        nx, ny = board.shape
+        self.shape = board.shape
+        self.tile = tile
+        self.num_tiles = (-(-nx // tile), -(-ny // tile))
+        size = (self.num_tiles[0] * tile + 2, self.num_tiles[1] * tile + 2)
+
+        # Both generations are kept with a border of dead cells, and
+        # agree everywhere except in the tiles that changed last time.
+        self.current = np.zeros(size, np.uint8)
+        self.current[1:nx+1, 1:ny+1] = board
+        self.next = self.current.copy()
+        self.inside = np.zeros(size, bool)
+        self.inside[1:nx+1, 1:ny+1] = True
+        self.changed = np.ones(self.num_tiles, bool)
+        self.fractions = []
+
+    def tiles(self, a):
+        '''View a bordered array as (tile x, tile y, x, y) without its border.'''
+        t = self.tile
+        s0, s1 = a.strides
+        return as_strided(a[1:, 1:], self.num_tiles + (t, t),
+                          (t*s0, t*s1, s0, s1))
+
+    def halos(self, a):
+        '''Like tiles, but each tile includes the cells around it.'''
+        t = self.tile
+        s0, s1 = a.strides
+        return as_strided(a, self.num_tiles + (t+2, t+2),
+                          (t*s0, t*s1, s0, s1))
+
+    def step(self):
+        # Tiles that changed, and their neighbours.
+        c = self.changed
+        near = c.copy()
+        near[1:, :] |= c[:-1, :]
+        near[:-1, :] |= c[1:, :]
+        active = near.copy()
+        active[:, 1:] |= near[:, :-1]
+        active[:, :-1] |= near[:, 1:]
+        tx, ty = np.nonzero(active)
+        self.fractions.append(len(tx) / float(active.size))
+        if len(tx) == 0:
+            return
+
+        w = self.halos(self.current)[tx, ty]
+        old = w[:, 1:-1, 1:-1]
+        neighbors = w[:, :-2, :-2] + w[:, :-2, 1:-1] + w[:, :-2, 2:] + \
+                    w[:, 1:-1, :-2] + w[:, 1:-1, 2:] + \
+                    w[:, 2:, :-2] + w[:, 2:, 1:-1] + w[:, 2:, 2:]
+        new = (neighbors == 3) | ((old == 1) & (neighbors == 2))
+        new &= self.tiles(self.inside)[tx, ty]
+        new = new.astype(np.uint8)
+        self.tiles(self.next)[tx, ty] = new
+
+        self.changed = np.zeros(self.num_tiles, bool)
+        self.changed[tx, ty] = (new != old).reshape(len(tx), -1).any(axis=1)
+        self.current, self.next = self.next, self.current
+
+    def board(self):
+        nx, ny = self.shape
+        return self.current[1:nx+1, 1:ny+1]
+
+def evolve(length, generations, tile=16):
+    current = np.zeros((length, length), np.uint8)  # create the initial world
+    current[length/2, 1:(length-1)] = 1             # initialize the world
+    life = TiledLife(current, tile)
+
+    # advance through each time step
+    life_convolve.show(life.board())
+    for i in range(generations):
+        life.step()
+        life_convolve.show(life.board())
+
+def stats(length, generations, tile=16):
+    '''Run a random soup in one corner of the board, reporting the
+    fraction of tiles recomputed and the time against life_convolve.'''
+    board = np.zeros((length, length), np.uint8)
+    corner = max(length // 8, 1)
+    board[:corner, :corner] = life_convolve.random_board(corner, 0.3, 0)
+    expected, t_convolve = life_convolve.reference(board, generations)
+
+    life = TiledLife(board, tile)
+    start = time.time()
+    for i in range(generations):
+        life.step()
+    t_tiles = time.time() - start
+
+    print '%-10s %10s' % ('generation', 'active')
+    for (i, fraction) in enumerate(life.fractions):
+        if i % max(generations // 20, 1) == 0:
+            print '%-10d %10.3f' % (i, fraction)
+    print 'mean active fraction %.3f' % np.mean(life.fractions)
+    print 'convolve %.3f sec, tiles %.3f sec, same result: %s' % \
+          (t_convolve, t_tiles, (life.board() == expected).all())
+
+def main(args):
+    length = int(args[1])
+    if len(args) > 2:
+        generations = int(args[2])
+    else:
+        generations = length - 1
+    if len(args) > 3 and args[3] == 'stats':
+        stats(length, generations)
+    else:
+        evolve(length, generations)
+
+if __name__ == '__main__':
+    main(sys.argv)
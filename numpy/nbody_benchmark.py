@@ -0,0 +1,253 @@
+# Benchmark every n-body implementation on the same problems.
+#
+# nbody-original.py, nbody-final.py, nbody-reoptimized.py and
+# nbody-slots.py (in ../more/oop) and nbody_numpy.py (here) each store
+# bodies differently and have their own driver.  This program wraps
+# each one in an adapter with the same three methods:
+#
+#     adapter = Adapter(raw)           # raw is a list of
+#                                      # [name, px, py, pz, vx, vy, vz, m]
+#     adapter.advance(dt, num_steps)
+#     adapter.total_energy()
+#
+# and runs them all on identical initial conditions for a range of
+# system sizes.  The number of steps shrinks as n grows so that every
+# run does roughly the same number of pairwise interactions.  Each run
+# happens in its own process so that its peak memory can be measured.
+#
+# usage: nbody_benchmark.py [json_file [interactions [n1 n2 ...]]]
+
+import sys
+import os
+import imp
+import time
+import json
+import resource
+import Queue
+import multiprocessing as mp
+
+import nbody_numpy
+from nbody_parallel import random_system
+
+OOP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       os.pardir, 'more', 'oop')
+
+DEFAULT_SIZES = [5, 10, 20, 40, 80]
+DEFAULT_INTERACTIONS = 500000
+TIMESTEP_LEN = 0.01
+
+#-------------------------------------------------------------------------------
+
+def load(filename):
+    """
+    Import one of the pure-Python programs (whose names contain
+    dashes, so they can't be imported with an import statement).
+    """
+    name = os.path.splitext(filename)[0].replace('-', '_')
+    return imp.load_source(name, os.path.join(OOP_DIR, filename))
+
+class OriginalAdapter(object):
+    """
+    nbody-original.py: bodies are ([x, y, z], [vx, vy, vz], m) tuples.
+    """
+
+    module = 'nbody-original.py'
+
+    def __init__(self, raw):
+        self.nbody = load(self.module)
+        self.bodies = [(list(b[1:4]), list(b[4:7]), b[7]) for b in raw]
+        self.pairs = self.nbody.combinations(self.bodies)
+
+    def advance(self, dt, num_steps):
+        self.nbody.advance(dt, num_steps, self.bodies, self.pairs)
+
+    def total_energy(self):
+        return self.nbody.report_energy(self.bodies, self.pairs)
+
+class FinalAdapter(object):
+    """
+    nbody-final.py and nbody-reoptimized.py: bodies are Body objects
+    holding Vec3 positions and velocities.
+    """
+
+    module = 'nbody-final.py'
+
+    def __init__(self, raw):
+        self.nbody = load(self.module)
+        Vec3 = self.nbody.Vec3
+        self.bodies = [self.nbody.Body(b[0], Vec3(*b[1:4]), Vec3(*b[4:7]), b[7])
+                       for b in raw]
+
+    def advance(self, dt, num_steps):
+        self.nbody.advance(dt, num_steps, self.bodies)
+
+    def total_energy(self):
+        return self.nbody.total_energy(self.bodies)
+
+class ReoptimizedAdapter(FinalAdapter):
+
+    module = 'nbody-reoptimized.py'
+
+class SlotsAdapter(FinalAdapter):
+    """
+    nbody-slots.py: like nbody-final.py, but the list of pairs is
+    built once and passed in.
+    """
+
+    module = 'nbody-slots.py'
+
+    def __init__(self, raw):
+        FinalAdapter.__init__(self, raw)
+        self.pairs = self.nbody.pairs_of(self.bodies)
+
+    def advance(self, dt, num_steps):
+        self.nbody.advance(dt, num_steps, self.bodies, self.pairs)
+
+    def total_energy(self):
+        return self.nbody.total_energy(self.bodies, self.pairs)
+
+class NumpyAdapter(object):
+    """
+    nbody_numpy.py: bodies are rows of position, velocity and mass arrays.
+    """
+
+    def __init__(self, raw):
+        self.positions, self.velocities, self.masses = nbody_numpy.setup(raw)
+
+    def advance(self, dt, num_steps):
+        nbody_numpy.advance(dt, num_steps,
+                            self.positions, self.velocities, self.masses)
+
+    def total_energy(self):
+        return nbody_numpy.total_energy(self.positions, self.velocities,
+                                        self.masses)
+
+IMPLEMENTATIONS = [
+    ('original', OriginalAdapter),
+    ('final', FinalAdapter),
+    ('reoptimized', ReoptimizedAdapter),
+    ('slots', SlotsAdapter),
+    ('numpy', NumpyAdapter)
+]
+
+#-------------------------------------------------------------------------------
+
+def initial_conditions(num_bodies):
+    """
+    Create a system of bodies whose total momentum is zero, so that
+    no implementation's own offset_momentum is needed.
+    """
+    raw = random_system(num_bodies)
+    sun = raw[0]
+    for axis in range(3):
+        momentum = sum(b[4 + axis] * b[7] for b in raw[1:])
+        sun[4 + axis] = -momentum / sun[7]
+    return raw
+
+def peak_memory_kb():
+    """
+    High-water mark of this process's resident set size, in KB
+    (getrusage reports bytes on Mac OS X and KB on Linux).
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak //= 1024
+    return peak
+
+def run_one(adapter_class, raw, num_steps, results):
+    """
+    Time a single implementation on a single system, putting a
+    dictionary of results on the queue.  Run in a child process.
+    """
+    memory_start = peak_memory_kb()
+    adapter = adapter_class(raw)
+    e_original = adapter.total_energy()
+    t_original = time.time()
+    adapter.advance(TIMESTEP_LEN, num_steps)
+    d_time = time.time() - t_original
+    e_final = adapter.total_energy()
+    results.put({
+        'steps_per_sec' : num_steps / d_time,
+        'energy_drift'  : abs((e_final - e_original) / e_original),
+        'peak_kb'       : peak_memory_kb() - memory_start
+    })
+
+def wait_for(child, results):
+    """
+    Return the dictionary a child running run_one puts on the queue,
+    or None if the child dies without putting one there (because its
+    implementation raised an exception, for example).
+    """
+    while True:
+        try:
+            return results.get(timeout=1)
+        except Queue.Empty:
+            if not child.is_alive():
+                break
+    # The child may have put its result there just before exiting.
+    try:
+        return results.get(timeout=1)
+    except Queue.Empty:
+        return None
+
+def benchmark(sizes, interactions):
+    """
+    Run every implementation on a system of each size, returning a
+    list of result dictionaries.
+    """
+    records = []
+    for num_bodies in sizes:
+        raw = initial_conditions(num_bodies)
+        num_pairs = num_bodies * (num_bodies - 1) // 2
+        num_steps = max(1, interactions // num_pairs)
+        for (name, adapter_class) in IMPLEMENTATIONS:
+            results = mp.Queue()
+            child = mp.Process(target=run_one,
+                               args=(adapter_class, raw, num_steps, results))
+            child.start()
+            record = wait_for(child, results)
+            child.join()
+            if record is None:
+                sys.stderr.write('%s failed on %d bodies (exit code %s)\n' %
+                                 (name, num_bodies, child.exitcode))
+                continue
+            record.update({'implementation' : name,
+                           'num_bodies'     : num_bodies,
+                           'num_steps'      : num_steps})
+            records.append(record)
+    return records
+
+def show(records):
+    """
+    Print benchmark results as a table.
+    """
+    print "%-12s %6s %8s %14s %12s %10s" % \
+          ("Program", "n", "Steps", "Steps/sec", "dE/E", "Peak KB")
+    for r in records:
+        print "%-12s %6d %8d %14.2f %12.3e %10d" % \
+              (r['implementation'], r['num_bodies'], r['num_steps'],
+               r['steps_per_sec'], r['energy_drift'], r['peak_kb'])
+
+#-------------------------------------------------------------------------------
+
+def main(args):
+    json_file = None
+    interactions = DEFAULT_INTERACTIONS
+    sizes = DEFAULT_SIZES
+    if len(args) > 1:
+        json_file = args[1]
+    if len(args) > 2:
+        interactions = int(args[2])
+    if len(args) > 3:
+        sizes = [int(x) for x in args[3:]]
+
+    records = benchmark(sizes, interactions)
+    show(records)
+    if json_file:
+        with open(json_file, 'w') as writer:
+            json.dump(records, writer, indent=2, sort_keys=True)
+
+#-------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,209 @@
+# Parallel version of nbody_numpy.py.
+#
+# Positions, velocities and masses are kept in multiprocessing shared
+# memory.  Each timestep, the rows of the force calculation are split
+# into blocks of bodies, and a pool of worker processes accumulates
+# the change in velocity for its blocks directly into a shared buffer.
+# Since every worker reads the same positions and writes only its own
+# rows, no locking is needed; the parent process then applies the
+# velocity and position updates.
+#
+# usage: nbody_parallel.py num_bodies num_timesteps [max_workers]
+
+import sys
+import time
+import random
+import multiprocessing as mp
+import numpy as np
+
+from nbody_numpy import SOLAR_MASS, DAYS_PER_YEAR, \
+     setup, advance, total_energy, offset_momentum
+
+# Largest number of (body, body) interactions a worker handles at once.
+# This bounds the size of the temporary arrays built for each block.
+CHUNK_INTERACTIONS = 2 ** 16
+
+#-------------------------------------------------------------------------------
+
+def share(arr):
+    """
+    Copy a float64 array into shared memory, returning the raw shared
+    buffer and a NumPy array that views it.
+    """
+    raw = mp.RawArray('d', arr.size)
+    view = as_array(raw, arr.shape)
+    view[...] = arr
+    return raw, view
+
+def as_array(raw, shape):
+    """
+    View a raw shared buffer as a float64 array of the given shape.
+    """
+    return np.frombuffer(raw, dtype=np.float64).reshape(shape)
+
+#-------------------------------------------------------------------------------
+
+# Views of the shared arrays inside each worker process (set up once by
+# init_worker, so that they are not pickled again on every step).
+_positions = None
+_masses = None
+_d_vel = None
+
+def init_worker(raw_positions, raw_masses, raw_d_vel, num_bodies):
+    """
+    Attach a worker process to the shared arrays.
+    """
+    global _positions, _masses, _d_vel
+    _positions = as_array(raw_positions, (num_bodies, 3))
+    _masses = as_array(raw_masses, (num_bodies,))
+    _d_vel = as_array(raw_d_vel, (num_bodies, 3))
+
+def accumulate(args):
+    """
+    Calculate the change in velocity of bodies start..stop-1 caused by
+    every other body, and store it in the shared d_vel buffer.
+    """
+    start, stop, dt = args
+    num_bodies = len(_masses)
+    rows = max(1, CHUNK_INTERACTIONS // num_bodies)
+    for lo in xrange(start, stop, rows):
+        hi = min(lo + rows, stop)
+        d_pos = _positions[lo:hi, np.newaxis, :] - _positions[np.newaxis, :, :]
+        dist2 = (d_pos ** 2).sum(axis=2)
+        # A body exerts no force on itself: inf ** -1.5 is zero.
+        dist2[np.arange(hi - lo), np.arange(lo, hi)] = np.inf
+        forces = _masses * (dt * dist2 ** -1.5)
+        _d_vel[lo:hi] = -(d_pos * forces[:, :, np.newaxis]).sum(axis=1)
+
+#-------------------------------------------------------------------------------
+
+class SharedSystem(object):
+    """
+    An n-body system whose state lives in shared memory, stepped by a
+    pool of worker processes.  The positions, velocities and masses
+    attributes are ordinary NumPy arrays, so the functions in
+    nbody_numpy.py can be used on them directly.
+    """
+
+    def __init__(self, positions, velocities, masses, num_workers):
+        num_bodies = len(masses)
+        raw_positions, self.positions = share(positions)
+        raw_velocities, self.velocities = share(velocities)
+        raw_masses, self.masses = share(masses)
+        raw_d_vel, self.d_vel = share(np.zeros((num_bodies, 3)))
+        self.num_workers = num_workers
+        self.blocks = split(num_bodies, num_workers)
+        self.pool = mp.Pool(num_workers, init_worker,
+                            (raw_positions, raw_masses, raw_d_vel, num_bodies))
+
+    def advance(self, dt, num_steps):
+        """
+        Advance the simulation a specified number of timesteps.
+        """
+        work = [(start, stop, dt) for (start, stop) in self.blocks]
+        for step in xrange(num_steps):
+            self.pool.map(accumulate, work)
+            self.velocities += self.d_vel
+            self.positions += self.velocities * dt
+
+    def close(self):
+        """
+        Shut down the worker processes.
+        """
+        self.pool.close()
+        self.pool.join()
+
+def split(num_bodies, num_blocks):
+    """
+    Split range(num_bodies) into num_blocks (start, stop) pairs of
+    nearly equal size.
+    """
+    bounds = np.linspace(0, num_bodies, num_blocks + 1).astype(int)
+    return [(bounds[i], bounds[i+1]) for i in range(num_blocks)
+            if bounds[i] < bounds[i+1]]
+
+#-------------------------------------------------------------------------------
+
+def random_system(num_bodies, seed=1):
+    """
+    Create a list-of-lists of [name, px, py, pz, vx, vy, vz, m] records
+    for a sun orbited by num_bodies-1 small bodies in a thin disc, in
+    the same format accepted by nbody_numpy.setup.
+    """
+    rng = random.Random(seed)
+    result = [['Sun', 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, SOLAR_MASS]]
+    for i in range(1, num_bodies):
+        radius = rng.uniform(2.0, 30.0)
+        angle = rng.uniform(0.0, 2 * np.pi)
+        speed = (SOLAR_MASS / radius) ** 0.5
+        result.append(['Body %d' % i,
+                       radius * np.cos(angle),
+                       radius * np.sin(angle),
+                       rng.gauss(0.0, 0.1),
+                       -speed * np.sin(angle),
+                       speed * np.cos(angle),
+                       rng.gauss(0.0, 1.0e-3) * DAYS_PER_YEAR,
+                       rng.uniform(1.0e-6, 1.0e-3) * SOLAR_MASS])
+    return result
+
+def run_serial(raw, timestep_len, num_timesteps):
+    """
+    Time nbody_numpy.advance on a system, returning the elapsed time
+    and the relative change in energy.
+    """
+    positions, velocities, masses = setup(raw)
+    offset_momentum(0, velocities, masses)
+    e_original = total_energy(positions, velocities, masses)
+    t_original = time.time()
+    advance(timestep_len, num_timesteps, positions, velocities, masses)
+    d_time = time.time() - t_original
+    e_final = total_energy(positions, velocities, masses)
+    return d_time, abs((e_final - e_original) / e_original)
+
+def run_parallel(raw, timestep_len, num_timesteps, num_workers):
+    """
+    Time SharedSystem.advance on a system with a given number of
+    workers, returning the elapsed time and the relative change in
+    energy.  Pool startup is not included in the time.
+    """
+    positions, velocities, masses = setup(raw)
+    offset_momentum(0, velocities, masses)
+    system = SharedSystem(positions, velocities, masses, num_workers)
+    try:
+        e_original = total_energy(system.positions, system.velocities,
+                                  system.masses)
+        t_original = time.time()
+        system.advance(timestep_len, num_timesteps)
+        d_time = time.time() - t_original
+        e_final = total_energy(system.positions, system.velocities,
+                               system.masses)
+    finally:
+        system.close()
+    return d_time, abs((e_final - e_original) / e_original)
+
+#-------------------------------------------------------------------------------
+
+def main(args):
+    num_bodies = int(args[1])
+    num_timesteps = int(args[2])
+    if len(args) > 3:
+        max_workers = int(args[3])
+    else:
+        max_workers = mp.cpu_count()
+    timestep_len = 0.01
+    raw = random_system(num_bodies)
+
+    print "%d bodies, %d timesteps" % (num_bodies, num_timesteps)
+    print "%-9s %12s %9s %12s" % ("Workers", "Time (s)", "Speedup", "dE/E")
+    base, d_energy = run_serial(raw, timestep_len, num_timesteps)
+    print "%-9s %12.6f %9.2f %12.3e" % ("serial", base, 1.0, d_energy)
+    for num_workers in range(1, max_workers + 1):
+        d_time, d_energy = run_parallel(raw, timestep_len, num_timesteps,
+                                        num_workers)
+        print "%-9d %12.6f %9.2f %12.3e" % \
+              (num_workers, d_time, base / d_time, d_energy)
+
+#-------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,174 @@
+# Record the trajectories of an n-body simulation to disk.
+#
+# simulate() in nbody_numpy.py only reports the final energy, and
+# drawing every step (as nbody-visualized.py does) costs far more than
+# the physics.  Here the simulation instead appends a snapshot of the
+# positions every few steps to a binary file, buffering snapshots in
+# memory and writing them in chunks.  The file can then be opened with
+# a memory map, so that a viewer can pull out any range of time without
+# reading the whole trajectory.
+#
+# usage: nbody_trajectory.py filename num_timesteps [every [num_bodies]]
+
+import sys
+import os
+import numpy as np
+
+from nbody_numpy import setup, advance, total_energy, offset_momentum
+from nbody_parallel import random_system
+
+# Files start with a fixed-size text header describing their layout.
+MAGIC = 'NBODYTRJ'
+HEADER_SIZE = 128
+
+#-------------------------------------------------------------------------------
+
+class TrajectoryWriter(object):
+    """
+    Append snapshots of body positions to a trajectory file.
+
+    every:     only keep one snapshot out of every this many offered
+    bodies:    indices of the bodies to record (default is all of them)
+    dtype:     type to store coordinates as (float32 halves the size)
+    chunk:     number of snapshots to buffer before writing
+    """
+
+    def __init__(self, filename, num_bodies, timestep_len, every=1,
+                 bodies=None, dtype=np.float64, chunk=256):
+        assert every > 0, 'Must keep at least one snapshot in every'
+        assert chunk > 0, 'Chunk size must be positive'
+        if bodies is None:
+            bodies = np.arange(num_bodies)
+        self.bodies = np.asarray(bodies)
+        self.every = every
+        self.offered = 0
+        self.dtype = np.dtype(dtype)
+        self.buffer = np.empty((chunk, len(self.bodies), 3), self.dtype)
+        self.filled = 0
+        self.writer = open(filename, 'wb')
+        header = '%s %s %d %d %r' % \
+                 (MAGIC, self.dtype.str, len(self.bodies),
+                  every, float(timestep_len))
+        assert len(header) < HEADER_SIZE, 'Header too long'
+        self.writer.write(header.ljust(HEADER_SIZE))
+
+    def append(self, positions):
+        """
+        Offer a snapshot of all the bodies' positions, which is kept
+        if it falls on the sampling interval.
+        """
+        keep = (self.offered % self.every) == 0
+        self.offered += 1
+        if not keep:
+            return
+        self.buffer[self.filled] = positions[self.bodies]
+        self.filled += 1
+        if self.filled == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        """
+        Write any buffered snapshots to the file.
+        """
+        self.buffer[:self.filled].tofile(self.writer)
+        self.filled = 0
+        self.writer.flush()
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+#-------------------------------------------------------------------------------
+
+class TrajectoryReader(object):
+    """
+    Read a trajectory file lazily through a memory map.  Snapshot i
+    holds the positions after i * every * timestep_len time units.
+    """
+
+    def __init__(self, filename):
+        with open(filename, 'rb') as reader:
+            fields = reader.read(HEADER_SIZE).split()
+        assert fields and fields[0] == MAGIC, \
+               '%s is not a trajectory file' % filename
+        self.dtype = np.dtype(fields[1])
+        self.num_bodies = int(fields[2])
+        self.every = int(fields[3])
+        self.timestep_len = float(fields[4])
+        frame_bytes = self.num_bodies * 3 * self.dtype.itemsize
+        self.num_frames = (os.path.getsize(filename) - HEADER_SIZE) // frame_bytes
+        shape = (self.num_frames, self.num_bodies, 3)
+        if self.num_frames == 0:
+            self.data = np.empty(shape, self.dtype)
+        else:
+            self.data = np.memmap(filename, dtype=self.dtype, mode='r',
+                                  offset=HEADER_SIZE, shape=shape)
+
+    def __len__(self):
+        return self.num_frames
+
+    def __getitem__(self, index):
+        return self.data[index]
+
+    def times(self):
+        """
+        Simulated time at which each snapshot was taken.
+        """
+        return np.arange(self.num_frames) * self.every * self.timestep_len
+
+    def between(self, t_start, t_stop, stride=1):
+        """
+        Return the snapshots taken in [t_start, t_stop), optionally
+        keeping only every stride'th one.  Only those snapshots are
+        read from disk.
+        """
+        step = self.every * self.timestep_len
+        # Round away the error in dividing by step, so that a time on a
+        # snapshot (like 0.07 with steps of 0.01) counts as on it.
+        first = max(0, int(np.ceil(np.round(t_start / step, 9))))
+        last = min(self.num_frames, int(np.ceil(np.round(t_stop / step, 9))))
+        return self.data[first:last:stride]
+
+#-------------------------------------------------------------------------------
+
+def record(dt, num_steps, positions, velocities, masses, writer):
+    """
+    Advance the simulation, offering the positions to a trajectory
+    writer before the first step and after each step.
+    """
+    writer.append(positions)
+    for step in xrange(num_steps):
+        advance(dt, 1, positions, velocities, masses)
+        writer.append(positions)
+
+#-------------------------------------------------------------------------------
+
+def main(args):
+    filename = args[1]
+    num_timesteps = int(args[2])
+    every = 1
+    num_bodies = 5
+    if len(args) > 3:
+        every = int(args[3])
+    if len(args) > 4:
+        num_bodies = int(args[4])
+    timestep_len = 0.01
+
+    positions, velocities, masses = setup(random_system(num_bodies))
+    offset_momentum(0, velocities, masses)
+    e_original = total_energy(positions, velocities, masses)
+    writer = TrajectoryWriter(filename, num_bodies, timestep_len, every)
+    record(timestep_len, num_timesteps, positions, velocities, masses, writer)
+    writer.close()
+    e_final = total_energy(positions, velocities, masses)
+    print "%-9s: %.9f - %.9f" % ("Final", e_final, e_original)
+
+    reader = TrajectoryReader(filename)
+    print "%d snapshots of %d bodies every %g time units" % \
+          (len(reader), reader.num_bodies, reader.every * reader.timestep_len)
+    print "last position of body 0:", reader[-1][0]
+
+#-------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    main(sys.argv)
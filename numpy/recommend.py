@@ -3,10 +3,24 @@ Original example from Toby Segaran: "Programming Collective Intelligence"
 Altered by Richard T. Guy (2010)
 '''
 
+import sys
+import os
+import csv
+import json
+import time
+import shutil
+import tempfile
+import multiprocessing as mp
+from array import array
+from itertools import islice
 from math import sqrt
 import numpy as np
+import scipy.sparse as sp
 
 EPS = 1.0e-9 # Never use == for floats.
+CHUNK = 65536 # lines read at a time by load_ratings
+BATCH = 256   # most people or papers whose similarities are computed at once
+BLOCK_BYTES = 1 << 26 # size of each dense temporary worked on at once
 
 raw_scores = {
   
@@ -67,11 +81,13 @@ raw_scores = {
     }
 }
 
-def prep_data(all_scores):
+def prep_data(all_scores, sparse=False):
     '''
     Turn {person : {title : score, ...} ...} into NumPy array.  Each
     row is a person, each column is a paper title.  Note that input
-    data is sparse (does not contain all person X paper pairs).
+    data is sparse (does not contain all person X paper pairs), so if
+    'sparse' is true, the ratings are returned as a SciPy CSR matrix
+    that only stores the scores people actually gave.
     '''
 
     # Names of all people in alphabetical order.
@@ -86,15 +102,170 @@ def prep_data(all_scores):
     papers = list(papers)
     papers.sort()
 
-    # Create and fill array.
-    ratings = np.zeros((len(people), len(papers)))
+    # Collect (person, paper, score) triples in one pass.
+    paper_ids = dict((title, i) for (i, title) in enumerate(papers))
+    rows, cols, scores = [], [], []
     for (person_id, person) in enumerate(people):
-        for (title_id, title) in enumerate(papers):
-            rating = all_scores[person].get(title, 0)
-            ratings[person_id, title_id] = float(rating)
+        for (title, rating) in all_scores[person].items():
+            rows.append(person_id)
+            cols.append(paper_ids[title])
+            scores.append(float(rating))
+
+    # Create and fill array.
+    shape = (len(people), len(papers))
+    if sparse:
+        ratings = sp.coo_matrix((scores, (rows, cols)), shape=shape).tocsr()
+    else:
+        ratings = np.zeros(shape)
+        ratings[rows, cols] = scores
+
+    return people, papers, ratings
+
+def read_triples(reader):
+    '''
+    Generate (person, paper, score) triples from a CSV or JSON-lines
+    file, one line at a time.  CSV files have person,paper,score on
+    each line (a first line whose score isn't a number is taken to be
+    a header); JSON-lines files have one {"person" : ..., "paper" :
+    ..., "score" : ...} object per line.
+    '''
+
+    if reader.name.endswith('.csv'):
+        for (i, fields) in enumerate(csv.reader(reader)):
+            if not fields:
+                continue
+            try:
+                score = float(fields[2])
+            except ValueError:
+                if i == 0:
+                    continue
+                raise
+            yield fields[0], fields[1], score
+    else:
+        for line in reader:
+            line = line.strip()
+            if line:
+                record = json.loads(line)
+                yield record['person'], record['paper'], float(record['score'])
+
+def load_ratings(filename, sparse=True):
+    '''
+    Build a ratings matrix from a CSV or JSON-lines file of (person,
+    paper, score) triples (see read_triples) without building the
+    nested dictionary that prep_data needs.  Names are turned into
+    integer ids as they're first seen, and the ids and scores are kept
+    in compact arrays, so memory grows with the number of ratings
+    rather than the size of the text.  Returns the list of people and
+    papers (in order of first appearance) and the ratings, as a CSR
+    matrix or (if 'sparse' is false) an array.  If someone rates the
+    same paper twice, the later score is used.
+    '''
+
+    person_ids = {}
+    paper_ids = {}
+    rows, cols, scores = array('i'), array('i'), array('d')
+    with open(filename, 'r') as reader:
+        triples = read_triples(reader)
+        while True:
+            chunk = list(islice(triples, CHUNK))
+            if not chunk:
+                break
+            for (person, paper, score) in chunk:
+                rows.append(person_ids.setdefault(person, len(person_ids)))
+                cols.append(paper_ids.setdefault(paper, len(paper_ids)))
+                scores.append(score)
+
+    people = [None] * len(person_ids)
+    for (name, i) in person_ids.items():
+        people[i] = name
+    papers = [None] * len(paper_ids)
+    for (title, i) in paper_ids.items():
+        papers[i] = title
+
+    # Keep only the last score for each (person, paper) pair.
+    rows = np.frombuffer(rows, dtype=np.intc)
+    cols = np.frombuffer(cols, dtype=np.intc)
+    scores = np.frombuffer(scores, dtype=np.float64)
+    keys = rows.astype(np.int64) * max(len(papers), 1) + cols
+    last = len(keys) - 1 - np.unique(keys[::-1], return_index=True)[1]
+    rows, cols, scores = rows[last], cols[last], scores[last]
+
+    shape = (len(people), len(papers))
+    if sparse:
+        ratings = sp.csr_matrix((scores, (rows, cols)), shape=shape)
+    else:
+        ratings = np.zeros(shape)
+        ratings[rows, cols] = scores
 
     return people, papers, ratings
 
+def get_row(prefs, index):
+    '''
+    Get one person's ratings as a 1-D NumPy array, whether prefs is
+    an array or a sparse matrix.
+    '''
+
+    if sp.issparse(prefs):
+        return prefs.getrow(index).toarray()[0]
+    return prefs[index, :]
+
+def get_rows(prefs, indices):
+    '''
+    Get several people's ratings as a 2-D NumPy array.
+    '''
+
+    if sp.issparse(prefs):
+        return prefs[indices].toarray()
+    return prefs[indices, :]
+
+def has_rated(prefs):
+    '''
+    Return a matrix like prefs with 1 where there is a rating and 0
+    where there isn't (sparse if prefs is).
+    '''
+
+    return (prefs > 0).astype(float)
+
+def squared(prefs):
+    '''
+    Square every rating, element by element.
+    '''
+
+    if sp.issparse(prefs):
+        return prefs.multiply(prefs)
+    return prefs ** 2
+
+def rating_parts(prefs):
+    '''
+    Return the "has rated" and squared versions of prefs that the
+    whole-matrix similarity functions need, so that callers working
+    through prefs a block at a time can build them only once.
+    '''
+
+    return has_rated(prefs), squared(prefs)
+
+def block_rows(num_columns):
+    '''
+    How many rows of a dense matrix num_columns wide to work on at
+    once, keeping each dense temporary to about BLOCK_BYTES.
+    '''
+
+    return max(1, min(BATCH, BLOCK_BYTES // (8 * max(num_columns, 1))))
+
+def product(left, right):
+    '''
+    Multiply two (dense or sparse) matrices, returning an array.
+    '''
+
+    if sp.issparse(right) and not sp.issparse(left):
+        # ndarray.dot doesn't understand sparse matrices.
+        result = right.T.dot(left.T).T
+    else:
+        result = left.dot(right)
+    if sp.issparse(result):
+        result = result.toarray()
+    return np.asarray(result)
+
 def sim_distance(prefs, left_index, right_index):
     '''
     Calculate distance-based similarity score for two people.  Prefs
@@ -105,16 +276,16 @@ def sim_distance(prefs, left_index, right_index):
     '''
 
     # Where do both people have preferences?
-    left_has_prefs = prefs[left_index, :] > 0
-    right_has_prefs = prefs[right_index, :] > 0
-    mask = np.logical_and(left_has_prefs, right_has_prefs)
+    rating_left = get_row(prefs, left_index)
+    rating_right = get_row(prefs, right_index)
+    mask = np.logical_and(rating_left > 0, rating_right > 0)
 
     # Not enough signal.
     if np.sum(mask) < EPS:
         return 0
 
     # Return sum-of-squares distance.
-    diff = prefs[left_index, mask] - prefs[right_index, mask]
+    diff = rating_left[mask] - rating_right[mask]
     sum_of_squares = np.linalg.norm(diff) ** 2
     result = 1. / (1. + sum_of_squares)
     return result
@@ -125,8 +296,8 @@ def sim_pearson(prefs, left_index, right_index):
     '''
 
     # Where do both have ratings?
-    rating_left = prefs[left_index, :]
-    rating_right = prefs[right_index, :]
+    rating_left = get_row(prefs, left_index)
+    rating_right = get_row(prefs, right_index)
     mask = np.logical_and(rating_left > 0, rating_right > 0)
 
     # Note that summing over Booleans gives number of Trues
@@ -148,94 +319,312 @@ def sim_pearson(prefs, left_index, right_index):
     r = numerator / denominator
     return r
 
+def distance_matrix(prefs, rows=None, parts=None):
+    '''
+    Calculate sim_distance for many pairs of people at once.  Element
+    [i, j] of the result is the similarity between person rows[i] and
+    person j (rows defaults to everyone, giving a people X people
+    matrix).
+
+    For people i and j, the sum of squared differences over the papers
+    they have both rated is sum(has_j * r_i**2 + has_i * r_j**2 -
+    2 * r_i * r_j), where has is 1 for rated papers and 0 otherwise
+    (unrated entries of prefs are already 0), so every pair is handled
+    by three matrix products.  prefs may be an array or a sparse matrix;
+    parts, if given, is rating_parts(prefs).
+    '''
+
+    if rows is None:
+        rows = slice(None)
+    has, squares = parts or rating_parts(prefs)
+    common = product(has[rows], has.T)
+    sum_of_squares = product(squares[rows], has.T) + \
+                     product(has[rows], squares.T) - \
+                     2 * product(prefs[rows], prefs.T)
+    # Rounding can leave tiny negative values where ratings match.
+    sum_of_squares = np.maximum(sum_of_squares, 0)
+    result = 1. / (1. + sum_of_squares)
+    result[common < EPS] = 0
+    return result
+
+def pearson_matrix(prefs, rows=None, parts=None):
+    '''
+    Calculate sim_pearson for many pairs of people at once, in the
+    same layout as distance_matrix.  Sums of ratings, squared ratings
+    and products over each pair's common papers come from matrix
+    products with the 0/1 "has rated" matrix.
+    '''
+
+    if rows is None:
+        rows = slice(None)
+    has, squares = parts or rating_parts(prefs)
+    n = product(has[rows], has.T)
+    sum_left = product(prefs[rows], has.T)
+    sum_right = product(has[rows], prefs.T)
+    sum_left_sq = product(squares[rows], has.T)
+    sum_right_sq = product(has[rows], squares.T)
+    sum_product = product(prefs[rows], prefs.T)
+
+    # Covariance and variances, normalized like np.cov.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        safe_n = np.maximum(n, 1)
+        scale = 1. / np.maximum(n - 1, 1)
+        covar = (sum_product - sum_left * sum_right / safe_n) * scale
+        var_left = np.maximum(sum_left_sq - sum_left ** 2 / safe_n, 0) * scale
+        var_right = np.maximum(sum_right_sq - sum_right ** 2 / safe_n, 0) * scale
+        denominator = np.sqrt(var_left) * np.sqrt(var_right)
+        result = covar / denominator
+    result[(n < 2) | (denominator < EPS)] = 0
+    return result
+
+# Whole-matrix versions of the pairwise similarity functions.
+MATRIX_FORMS = {
+    sim_distance : distance_matrix,
+    sim_pearson : pearson_matrix
+}
+
+def similarity_matrix(prefs, sim_func, rows=None, parts=None):
+    '''
+    Calculate similarity between people rows (default all) and every
+    person, using the whole-matrix form of sim_func if there is one
+    (passing it parts, if given) and calling it once per pair if
+    there isn't.
+    '''
+
+    if sim_func in MATRIX_FORMS:
+        return MATRIX_FORMS[sim_func](prefs, rows, parts)
+    if rows is None:
+        rows = range(prefs.shape[0])
+    result = np.zeros((len(rows), prefs.shape[0]))
+    for (i, person) in enumerate(rows):
+        for other in range(prefs.shape[0]):
+            result[i, other] = sim_func(prefs, person, other)
+    return result
+
+def best_of(scores, person, num):
+    '''
+    Given one person's row of a similarity matrix, return the num
+    highest (score, other) pairs, excluding the person themselves.
+    Ties are broken in favor of higher indices, as sorting and
+    reversing tuples would.
+    '''
+
+    others = np.arange(len(scores))
+    keep = others != person
+    scores, others = scores[keep], others[keep]
+    order = np.lexsort((others, scores))[::-1][:num]
+    return [(scores[i], others[i]) for i in order]
+
 def top_matches(ratings, person, num, sim_func):
     '''
     Return the most similar individuals to a person.
     '''
 
-    scores = []
-    for other in range(ratings.shape[0]):
-        if other != person:
-            scores.append((sim_func(ratings, person, other), other))
-
-    scores.sort()
-    scores.reverse()
-    return scores[0:num]
+    scores = similarity_matrix(ratings, sim_func, [person])[0]
+    return best_of(scores, person, num)
 
 def calculate_similar(paper_ids, ratings, num=10):
     '''
-    Find the papers that are most similar to each other.
+    Find the papers that are most similar to each other, working out
+    the similarities for a block of papers at a time.
     '''
 
     result = {}
-    ratings_by_paper = ratings.T
-    for item in range(ratings_by_paper.shape[0]):
-        unnamed_scores = top_matches(ratings_by_paper, item, num, sim_distance)
-        scores = [(x[0], paper_ids[x[1]]) for x in unnamed_scores]
-        result[paper_ids[item]] = scores
+    by_paper = ratings.T
+    if sp.issparse(by_paper):
+        by_paper = by_paper.tocsr()
+    parts = rating_parts(by_paper)
+    num_papers = by_paper.shape[0]
+    size = block_rows(num_papers)
+    for start in range(0, num_papers, size):
+        items = np.arange(start, min(start + size, num_papers))
+        similarity = distance_matrix(by_paper, items, parts)
+        for (row, item) in enumerate(items):
+            unnamed_scores = best_of(similarity[row], item, num)
+            scores = [(x[0], paper_ids[x[1]]) for x in unnamed_scores]
+            result[paper_ids[item]] = scores
 
     return result
 
-def recommend(prefs, subject, sim_func):
+def recommend_many(prefs, subjects, sim_func, num=None, parts=None):
     '''
-    Get recommendations for an individual from a weighted average of other people.
+    Get recommendations for several people at once.  Each paper's
+    score is the similarity-weighted average of the ratings given by
+    other people who have rated it, so for all subjects together the
+    weighted totals are one product of the similarity matrix with the
+    ratings, and the weights are one product with the "has rated"
+    matrix.  Returns one list of (score, title) pairs per subject,
+    best first, holding at most num entries (default all).  parts, if
+    given, is rating_parts(prefs).  The dense arrays built are
+    subjects X people and subjects X papers, so callers with many
+    people or papers should pass a few subjects at a time (see
+    block_rows).
     '''
 
-    totals = {}
-    sim_sums = {}
-    num_people = prefs.shape[0]
-    num_papers = prefs.shape[1]
-
-    for other in range(num_people):
+    subjects = list(subjects)
+    parts = parts or rating_parts(prefs)
+    sims = similarity_matrix(prefs, sim_func, subjects, parts)
+
+    # Don't compare people to themselves, and ignore scores of zero or lower.
+    sims[np.arange(len(subjects)), subjects] = 0
+    sims[sims < EPS] = 0
+
+    totals = product(sims, prefs)
+    sim_sums = product(sims, parts[0])
+
+    # Only score papers the subject hasn't seen yet and someone similar has.
+    candidates = (get_rows(prefs, subjects) < EPS) & (sim_sums > EPS)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = np.where(candidates, totals / sim_sums, -np.inf)
+
+    results = []
+    for (row, allowed) in zip(scores, candidates):
+        count = allowed.sum()
+        if num is not None and num < count:
+            # Partition to find the num'th best score, then keep
+            # everything better plus enough of the papers tied with it.
+            cutoff = row[np.argpartition(-row, num - 1)[num - 1]]
+            better = np.flatnonzero(row > cutoff)
+            tied = np.flatnonzero(row == cutoff)
+            best = np.concatenate((better, tied[::-1][:num - len(better)]))
+        else:
+            best = np.flatnonzero(allowed)
+        # Highest score first, ties to the higher title index.
+        best = best[np.lexsort((best, row[best]))[::-1]]
+        results.append([(row[title], title) for title in best])
+    return results
+
+def recommend(prefs, subject, sim_func, num=None):
+    '''
+    Get recommendations for an individual from a weighted average of other people.
+    '''
 
-        # Don't compare people to themselves.
-        if other == subject:
-            continue
-        sim = sim_func(prefs, subject, other)
+    return recommend_many(prefs, [subject], sim_func, num)[0]
 
-        # ignore scores of zero or lower
-        if sim < EPS:
-            continue
+def share_ratings(prefs, directory):
+    '''
+    Save a ratings array or CSR matrix as .npy files in 'directory',
+    so that other processes can map them read-only instead of each
+    holding a copy.
+    '''
 
-        for title in range(num_papers):
+    if sp.issparse(prefs):
+        prefs = prefs.tocsr()
+        for name in ('data', 'indices', 'indptr'):
+            np.save(os.path.join(directory, name + '.npy'), getattr(prefs, name))
+        np.save(os.path.join(directory, 'shape.npy'), np.array(prefs.shape))
+    else:
+        np.save(os.path.join(directory, 'dense.npy'), prefs)
 
-            # Only score papers this person hasn't seen yet.
-            if prefs[subject, title] < EPS and prefs[other, title] > EPS:
+def map_ratings(directory):
+    '''
+    Map ratings saved by share_ratings back into memory (read-only).
+    '''
 
-                # Similarity * Score
-                if title in totals:
-                    totals[title] += prefs[other, title] * sim
-                else:
-                    totals[title] = 0
+    dense = os.path.join(directory, 'dense.npy')
+    if os.path.exists(dense):
+        return np.load(dense, mmap_mode='r')
+    parts = [np.load(os.path.join(directory, name + '.npy'), mmap_mode='r')
+             for name in ('data', 'indices', 'indptr')]
+    shape = tuple(np.load(os.path.join(directory, 'shape.npy')))
+    return sp.csr_matrix(tuple(parts), shape=shape, copy=False)
+
+# Ratings, and their rating_parts, seen by each worker process,
+# mapped once by attach_worker.
+_worker_prefs = None
+_worker_parts = None
+
+def attach_worker(directory):
+    global _worker_prefs, _worker_parts
+    _worker_prefs = map_ratings(os.path.join(directory, 'ratings'))
+    _worker_parts = (map_ratings(os.path.join(directory, 'has')),
+                     map_ratings(os.path.join(directory, 'squares')))
+
+def recommend_block(args):
+    '''
+    Recommend papers for a block of subjects (run in a worker).
+    '''
 
-                # Sum of similarities
-                if title in sim_sums():
-                    sim_sums[title] += sim
-                else:
-                    sim_sums[title] = 0
+    subjects, sim_func, num = args
+    return subjects, recommend_many(_worker_prefs, subjects, sim_func, num,
+                                    _worker_parts)
 
-    # Create the normalized list
+def recommend_all(prefs, people, papers, output, sim_func=sim_distance,
+                  num=10, num_workers=None):
+    '''
+    Write the top num recommendations for every person to the file
+    'output' as tab-separated person, rank, paper and score, using a
+    pool of worker processes that share one read-only copy of the
+    ratings (and of their rating_parts).  Each worker is handed as
+    many subjects at a time as keeps its dense temporaries to about
+    BLOCK_BYTES.  Returns the number of subjects handled per second.
+    '''
 
-    rankings = []
-    for title, total in totals.items():
-        rankings.append((total/sim_sums[title], title))
+    if num_workers is None:
+        num_workers = mp.cpu_count()
+    directory = tempfile.mkdtemp()
+    try:
+        has, squares = rating_parts(prefs)
+        for (name, matrix) in (('ratings', prefs), ('has', has),
+                               ('squares', squares)):
+            os.mkdir(os.path.join(directory, name))
+            share_ratings(matrix, os.path.join(directory, name))
+        del has, squares
+        size = block_rows(max(prefs.shape))
+        work = [(range(start, min(start + size, len(people))), sim_func, num)
+                for start in range(0, len(people), size)]
+        start = time.time()
+        pool = mp.Pool(num_workers, attach_worker, (directory,))
+        try:
+            with open(output, 'w') as writer:
+                for (subjects, results) in pool.imap(recommend_block, work):
+                    for (subject, rankings) in zip(subjects, results):
+                        for (rank, (score, title)) in enumerate(rankings):
+                            writer.write('%s\t%d\t%s\t%.6f\n' % \
+                                         (people[subject], rank + 1,
+                                          papers[title], score))
+        finally:
+            pool.close()
+            pool.join()
+        elapsed = time.time() - start
+    finally:
+        shutil.rmtree(directory)
+    return len(people) / max(elapsed, EPS)
+
+def batch(args):
+    '''
+    Usage: recommend.py batch ratings_file output_file [num_workers [num]]
+    '''
 
-    # Return the sorted list
-    rankings.sort()
-    rankings.reverse()
-    return rankings
+    people, papers, ratings = load_ratings(args[0])
+    num_workers = None
+    num = 10
+    if len(args) > 2:
+        num_workers = int(args[2])
+    if len(args) > 3:
+        num = int(args[3])
+    rate = recommend_all(ratings, people, papers, args[1],
+                         num=num, num_workers=num_workers)
+    print '%d subjects, %.1f subjects/sec' % (len(people), rate)
 
 def test():
     person_ids, paper_ids, all_ratings = prep_data(raw_scores)
     print 'person_ids', person_ids
     print 'paper_ids', paper_ids
     print 'all_ratings', all_ratings
+    sparse_ratings = prep_data(raw_scores, sparse=True)[2]
+    print 'sparse ratings match', (sparse_ratings.toarray() == all_ratings).all()
     print 'similarity distance', sim_distance(all_ratings, 0, 1)
     print 'similarity Pearson', sim_pearson(all_ratings, 0, 1)
     print top_matches(all_ratings, 0, 5, sim_pearson)
     print calculate_similar(paper_ids, all_ratings)
     print recommend(all_ratings, 0, sim_distance)
     print recommend(all_ratings, 1, sim_distance)
+    print recommend(all_ratings, 6, sim_pearson)
+    print recommend_many(all_ratings, [3, 6], sim_distance, 2)
 
 if __name__ == '__main__':
-    test()
+    if len(sys.argv) > 1 and sys.argv[1] == 'batch':
+        batch(sys.argv[2:])
+    else:
+        test()
@@ -0,0 +1,164 @@
+'''
+Precomputed "papers like this one" index for recommend.py.
+
+calculate_similar in recommend.py compares every paper with every
+other paper each time it is called.  This module does that work once,
+keeps only the num most similar neighbours of each paper, and saves
+them to disk as two small arrays (neighbour ids and scores).  When new
+ratings arrive for a few papers, only the affected entries are
+recomputed, so answering a query is a lookup.
+'''
+
+import numpy as np
+
+from recommend import raw_scores, prep_data, distance_matrix
+
+BLOCK = 256 # papers whose similarities are computed at once
+
+def best_neighbours(similarity, items, num):
+    '''
+    Given the rows of a similarity matrix for papers 'items', return
+    arrays of the num best neighbours of each (excluding itself) and
+    their scores, best first.
+    '''
+
+    rows = np.arange(len(items))[:, np.newaxis]
+    similarity = similarity.copy()
+    similarity[rows[:, 0], items] = -np.inf
+    best = np.argpartition(-similarity, num - 1, axis=1)[:, :num]
+    scores = similarity[rows, best]
+    order = np.argsort(-scores, axis=1, kind='mergesort')
+    return best[rows, order], scores[rows, order]
+
+class ItemIndex(object):
+    '''
+    The num most similar papers to each paper, by sim_distance over
+    the people who rated them.  neighbours[i] holds paper ids and
+    scores[i] their similarities to paper i, best first.
+    '''
+
+    def __init__(self, neighbours, scores):
+        self.neighbours = neighbours
+        self.scores = scores
+
+    @classmethod
+    def build(cls, ratings, num=10):
+        '''
+        Build an index from a people X papers ratings array (or
+        sparse matrix), a block of papers at a time.
+        '''
+
+        by_paper = ratings.T
+        num_papers = by_paper.shape[0]
+        num = min(num, num_papers - 1)
+        neighbours = np.empty((num_papers, num), np.int32)
+        scores = np.empty((num_papers, num), np.float32)
+        for start in range(0, num_papers, BLOCK):
+            items = np.arange(start, min(start + BLOCK, num_papers))
+            similarity = distance_matrix(by_paper, items)
+            neighbours[items], scores[items] = \
+                best_neighbours(similarity, items, num)
+        return cls(neighbours, scores)
+
+    @classmethod
+    def load(cls, filename):
+        '''
+        Read an index saved by save().
+        '''
+
+        data = np.load(filename)
+        return cls(data['neighbours'], data['scores'])
+
+    def save(self, filename):
+        '''
+        Write the index as an uncompressed .npz archive.
+        '''
+
+        np.savez(filename, neighbours=self.neighbours, scores=self.scores)
+
+    def similar(self, paper, num=None):
+        '''
+        Return (score, paper) pairs for the papers most like 'paper'.
+        '''
+
+        if num is None:
+            num = self.neighbours.shape[1]
+        return zip(self.scores[paper, :num], self.neighbours[paper, :num])
+
+    def update(self, ratings, changed):
+        '''
+        Bring the index up to date after the ratings of the papers in
+        'changed' have been altered (or the papers have been added to
+        the end of the ratings).  Only the rows of the changed papers
+        are recomputed in full.  Every other paper just merges in its
+        new scores with the changed papers, unless one of its old
+        neighbours has dropped below the rest of its list, in which
+        case a paper we never stored might now belong there and its
+        row is recomputed too.
+        '''
+
+        by_paper = ratings.T
+        num_papers = by_paper.shape[0]
+        num = self.neighbours.shape[1]
+        changed = np.unique(np.asarray(changed, dtype=int))
+
+        # Make room for papers that weren't in the index before.
+        old_papers = self.neighbours.shape[0]
+        if num_papers > old_papers:
+            extra = num_papers - old_papers
+            self.neighbours = np.vstack((self.neighbours,
+                                         np.zeros((extra, num), np.int32)))
+            self.scores = np.vstack((self.scores,
+                                     np.zeros((extra, num), np.float32)))
+            changed = np.union1d(changed, np.arange(old_papers, num_papers))
+
+        if len(changed) == 0:
+            return
+
+        # Recompute the changed papers' rows; similarity is symmetric,
+        # so these also give everyone else's scores with them.
+        fresh = distance_matrix(by_paper, changed)
+        self.neighbours[changed], self.scores[changed] = \
+            best_neighbours(fresh, changed, num)
+
+        # Only papers that listed a changed paper, or that a changed
+        # paper would now displace from the list, need any work.
+        is_changed = np.zeros(num_papers, bool)
+        is_changed[changed] = True
+        touched = is_changed[self.neighbours].any(axis=1) | \
+                  (fresh.max(axis=0) > self.scores[:, -1])
+        dirty = []
+        for paper in np.flatnonzero(touched & ~is_changed):
+            old_ids = self.neighbours[paper]
+            old_scores = self.scores[paper]
+            keep = ~is_changed[old_ids]
+            ids = np.concatenate((old_ids[keep], changed))
+            scores = np.concatenate((old_scores[keep], fresh[:, paper]))
+            order = np.argsort(-scores, kind='mergesort')[:num]
+            if (~keep).any() and scores[order[-1]] < old_scores[-1]:
+                dirty.append(paper)
+                continue
+            self.neighbours[paper] = ids[order]
+            self.scores[paper] = scores[order]
+
+        for start in range(0, len(dirty), BLOCK):
+            items = np.array(dirty[start:start + BLOCK])
+            similarity = distance_matrix(by_paper, items)
+            self.neighbours[items], self.scores[items] = \
+                best_neighbours(similarity, items, num)
+
+def test():
+    person_ids, paper_ids, all_ratings = prep_data(raw_scores)
+    index = ItemIndex.build(all_ratings, 3)
+    for (i, title) in enumerate(paper_ids):
+        print title, [(s, paper_ids[p]) for (s, p) in index.similar(i)]
+
+    # Someone changes their mind about one paper.
+    all_ratings[0, 2] = 5.0
+    index.update(all_ratings, [2])
+    rebuilt = ItemIndex.build(all_ratings, 3)
+    print 'update matches rebuild', \
+          np.allclose(index.scores, rebuilt.scores)
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,179 @@
+'''
+Approximate top_matches for large numbers of people.
+
+top_matches in recommend.py scores a person against everyone else.
+This module uses random-projection locality-sensitive hashing instead:
+each person's ratings (less their own average) are projected onto a
+few random directions, and the signs of the projections become a hash
+key.  People with similar tastes tend to get the same key, so only
+people who share a key with the subject in at least one of several
+tables are scored exactly.  More tables find more true matches (better
+recall); more bits per key make buckets smaller (more speed).
+
+usage: recommend_lsh.py [num_people [num_papers [num_tables [num_bits]]]]
+'''
+
+import sys
+import time
+import numpy as np
+import scipy.sparse as sp
+
+from recommend import similarity_matrix, best_of, top_matches, \
+     sim_pearson
+
+class NeighbourIndex(object):
+    '''
+    Hash tables of people keyed by the signs of random projections of
+    their mean-centered ratings.
+    '''
+
+    def __init__(self, prefs, num_tables=8, num_bits=6, seed=0):
+        self.prefs = prefs
+        random = np.random.RandomState(seed)
+        projections = random.normal(size=(num_tables * num_bits,
+                                          prefs.shape[1]))
+        signs = centered_product(prefs, projections) > 0
+        weights = 2 ** np.arange(num_bits)
+        self.keys = []
+        self.buckets = []
+        for t in range(num_tables):
+            bits = signs[:, t * num_bits:(t + 1) * num_bits]
+            keys = bits.dot(weights)
+            self.keys.append(keys)
+            self.buckets.append(group_by(keys))
+
+    def candidates(self, person):
+        '''
+        Return the people who share a bucket with 'person' in any table.
+        '''
+
+        found = [buckets[keys[person]]
+                 for (keys, buckets) in zip(self.keys, self.buckets)]
+        return np.setdiff1d(np.concatenate(found), [person])
+
+    def top_matches(self, person, num, sim_func):
+        '''
+        Approximate recommend.top_matches: score only the candidates.
+        '''
+
+        others = self.candidates(person)
+        people = np.concatenate(([person], others))
+        if sp.issparse(self.prefs):
+            subset = self.prefs[people]
+        else:
+            subset = self.prefs[people, :]
+        scores = similarity_matrix(subset, sim_func, [0])[0]
+        return [(score, people[i]) for (score, i) in best_of(scores, 0, num)]
+
+def centered_product(prefs, projections):
+    '''
+    Project each person's ratings, less their average rating, onto
+    each row of 'projections', without densifying sparse ratings.
+    '''
+
+    if sp.issparse(prefs):
+        prefs = prefs.tocsr(copy=True)
+        counts = np.diff(prefs.indptr)
+        means = np.asarray(prefs.sum(axis=1)).ravel() / np.maximum(counts, 1)
+        prefs.data -= np.repeat(means, counts)
+        return np.asarray(prefs.dot(projections.T))
+    has = prefs > 0
+    means = prefs.sum(axis=1) / np.maximum(has.sum(axis=1), 1)
+    centered = np.where(has, prefs - means[:, np.newaxis], 0)
+    return centered.dot(projections.T)
+
+def group_by(keys):
+    '''
+    Return a dictionary mapping each distinct key to an array of the
+    indices where it occurs.
+    '''
+
+    order = np.argsort(keys, kind='mergesort')
+    distinct, starts = np.unique(keys[order], return_index=True)
+    groups = np.split(order, starts[1:])
+    return dict(zip(distinct, groups))
+
+#-------------------------------------------------------------------------------
+
+def evaluate(prefs, index, subjects, num, sim_func):
+    '''
+    Compare approximate and exact top_matches for some subjects.
+    Returns a dictionary holding the fraction of exact matches found
+    (recall), the mean similarity of the approximate matches relative
+    to that of the exact ones (quality: many people are often almost
+    equally good matches), the mean number of people scored per
+    query, and the time taken by each method.
+    '''
+
+    found = 0
+    exact_total = 0.0
+    approx_total = 0.0
+    scored = 0
+    t_exact = 0.0
+    t_approx = 0.0
+    for person in subjects:
+        start = time.time()
+        exact = top_matches(prefs, person, num, sim_func)
+        t_exact += time.time() - start
+        start = time.time()
+        approx = index.top_matches(person, num, sim_func)
+        t_approx += time.time() - start
+        found += len(set(o for (s, o) in exact) & set(o for (s, o) in approx))
+        exact_total += sum(s for (s, o) in exact)
+        approx_total += sum(s for (s, o) in approx)
+        scored += len(index.candidates(person))
+    return {
+        'recall'  : float(found) / (num * len(subjects)),
+        'quality' : approx_total / exact_total,
+        'scored'  : float(scored) / len(subjects),
+        'exact'   : t_exact / len(subjects),
+        'approx'  : t_approx / len(subjects)
+    }
+
+def synthetic(num_people, num_papers, density=0.1, num_tastes=10, seed=0):
+    '''
+    Make a sparse ratings matrix in which people fall into groups
+    with similar tastes, so that there are real neighbours to find.
+    '''
+
+    random = np.random.RandomState(seed)
+    tastes = random.uniform(1, 5, (num_tastes, num_papers))
+    group = random.randint(num_tastes, size=num_people)
+    num_ratings = int(num_people * num_papers * density)
+    rows = random.randint(num_people, size=num_ratings)
+    cols = random.randint(num_papers, size=num_ratings)
+    scores = np.clip(np.round(tastes[group[rows], cols] +
+                              random.normal(0, 0.5, num_ratings)), 1, 5)
+    ratings = sp.coo_matrix((scores, (rows, cols)),
+                            shape=(num_people, num_papers)).tocsr()
+    ratings.sum_duplicates()
+    ratings.data = np.clip(ratings.data, 1, 5)
+    return ratings
+
+def main(args):
+    num_people = 20000
+    num_papers = 1000
+    num_tables = 8
+    num_bits = 6
+    if len(args) > 1:
+        num_people = int(args[1])
+    if len(args) > 2:
+        num_papers = int(args[2])
+    if len(args) > 3:
+        num_tables = int(args[3])
+    if len(args) > 4:
+        num_bits = int(args[4])
+
+    prefs = synthetic(num_people, num_papers)
+    start = time.time()
+    index = NeighbourIndex(prefs, num_tables, num_bits)
+    print 'index built in %.3f sec' % (time.time() - start)
+    subjects = range(0, num_people, max(1, num_people // 50))
+    result = evaluate(prefs, index, subjects, 10, sim_pearson)
+    print 'recall %.3f, quality %.3f, scored %.0f of %d people per query' % \
+          (result['recall'], result['quality'], result['scored'], num_people)
+    print 'exact %.4f sec/query, approximate %.4f sec/query' % \
+          (result['exact'], result['approx'])
+
+if __name__ == '__main__':
+    main(sys.argv)